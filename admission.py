@@ -0,0 +1,104 @@
+"""Admission control per route class.
+
+Requests are sorted into cheap reads, heavy reports and writes.  Each
+class has its own concurrency limit and a bounded wait queue, so a burst
+of report requests can only ever fill the report slots and registrations
+keep flowing.  A request that finds the queue full, or waits longer than
+the class deadline, is shed with a 503 and a Retry-After hint.
+"""
+import asyncio
+
+REPORT_PATHS = {
+    "/api/students",
+    "/api/application/all",
+    "/api/payment/all",
+    "/api/exam/all",
+    "/api/exam_schedule/all",
+    "/api/admit_card/all",
+    "/api/result/highest_mark",
+    "/api/result/lowest_mark",
+    "/api/result/ordered_by_marks",
+    "/api/unit/cutoffs",
+    "/api/analytics/marks_distribution",
+    "/api/analytics/revenue",
+    "/api/analytics/applications_per_unit",
+}
+# Report routes with a path parameter
+REPORT_PATH_PREFIXES = ("/api/unit/rank_list/",)
+
+# Long-lived change feed connections would otherwise hold read slots while idle
+EXEMPT_PATHS = {"/api/admission/stats", "/api/changes", "/api/changes/stream"}
+
+
+class Overloaded(Exception):
+    pass
+
+
+class RouteClassLimiter:
+    def __init__(self, name, max_concurrency, max_queue, max_wait_seconds, retry_after_seconds):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self.retry_after_seconds = retry_after_seconds
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_deadline = 0
+
+    async def acquire(self):
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.shed_queue_full += 1
+            raise Overloaded(f"{self.name} queue is full")
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.max_wait_seconds)
+        except asyncio.TimeoutError:
+            self.shed_deadline += 1
+            raise Overloaded(f"{self.name} wait deadline exceeded")
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        self.admitted += 1
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+    def stats(self):
+        return {
+            "MaxConcurrency": self.max_concurrency,
+            "MaxQueue": self.max_queue,
+            "Active": self.active,
+            "QueueDepth": self.waiting,
+            "Admitted": self.admitted,
+            "ShedQueueFull": self.shed_queue_full,
+            "ShedDeadline": self.shed_deadline,
+        }
+
+
+limiters = {
+    "read": RouteClassLimiter("read", max_concurrency=64, max_queue=256, max_wait_seconds=2.0,
+                              retry_after_seconds=1),
+    "report": RouteClassLimiter("report", max_concurrency=4, max_queue=16, max_wait_seconds=5.0,
+                                retry_after_seconds=10),
+    "write": RouteClassLimiter("write", max_concurrency=32, max_queue=512, max_wait_seconds=3.0,
+                               retry_after_seconds=2),
+}
+
+
+def limiter_for(method, path):
+    if path in EXEMPT_PATHS or not path.startswith("/api/"):
+        return None
+    if method not in ("GET", "HEAD"):
+        return limiters["write"]
+    if path in REPORT_PATHS or path.startswith(REPORT_PATH_PREFIXES):
+        return limiters["report"]
+    return limiters["read"]
+
+
+def stats():
+    return {name: limiter.stats() for name, limiter in limiters.items()}
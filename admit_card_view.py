@@ -0,0 +1,151 @@
+"""Denormalized, memory-resident admit cards keyed by StudentID.
+
+Each card is stored already joined with its Application, Student,
+ExamSchedule and Exam rows, so `/api/admit_card/by_student/{id}` is a
+dictionary lookup.  The view is built in bulk (at startup or on demand
+before an exam).  Writes to any table a card copies from (AdmitCard,
+ExamSchedule, Application, Student and Exam) refresh just the cards
+holding that key, found through the per-column indexes in INDEXED.
+"""
+import threading
+
+# Card column -> VIEW_QUERY condition used to reload the cards holding one of its values
+INDEXED = {
+    "ExamScheduleID": "ac.ExamScheduleID = %s",
+    "ApplicationID": "ac.ApplicationID = %s",
+    "ExamID": "es.ExamID = %s",
+}
+
+VIEW_QUERY = """
+    SELECT ac.AdmitCardID, ac.ApplicationID, ac.ExamScheduleID, ac.AdmitDate,
+           a.StudentID, s.Name, a.UnitID,
+           es.ExamID, e.ExamName, es.ExamDate, es.ExamTime, es.VenueID
+    FROM AdmitCard ac
+    JOIN Application a ON ac.ApplicationID = a.ApplicationID
+    JOIN Student s ON a.StudentID = s.StudentID
+    LEFT JOIN ExamSchedule es ON ac.ExamScheduleID = es.ExamScheduleID
+    LEFT JOIN Exam e ON es.ExamID = e.ExamID
+"""
+
+
+def to_card(row):
+    return {
+        "AdmitCardID": row[0],
+        "ApplicationID": row[1],
+        "ExamScheduleID": row[2],
+        "AdmitDate": str(row[3]),
+        "StudentID": row[4],
+        "Name": row[5],
+        "UnitID": row[6],
+        "ExamID": row[7],
+        "ExamName": row[8],
+        "ExamDate": str(row[9]) if row[9] is not None else None,
+        "ExamTime": str(row[10]) if row[10] is not None else None,
+        "VenueID": row[11],
+    }
+
+
+class AdmitCardView:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_student = {}
+        self._index = {column: {} for column in INDEXED}
+        self._cards = {}
+
+    def __len__(self):
+        return len(self._cards)
+
+    def lookup(self, student_id):
+        return self._by_student.get(student_id, ())
+
+    def card(self, admit_card_id):
+        return self._cards.get(admit_card_id)
+
+    def build(self, connection, batch_size=10000):
+        cards = {}
+        cursor = connection.cursor()
+        try:
+            cursor.execute(VIEW_QUERY)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    cards[row[0]] = to_card(row)
+        finally:
+            cursor.close()
+
+        by_student = {}
+        index = {column: {} for column in INDEXED}
+        for card in cards.values():
+            by_student.setdefault(card["StudentID"], []).append(card)
+            for column, by_value in index.items():
+                by_value.setdefault(card[column], set()).add(card["AdmitCardID"])
+        with self._lock:
+            self._cards = cards
+            self._index = index
+            self._by_student = {student_id: _sorted(group) for student_id, group in by_student.items()}
+
+    def refresh_card(self, connection, admit_card_id):
+        self._refresh(connection, "ac.AdmitCardID = %s", admit_card_id, [admit_card_id])
+
+    def refresh_schedule(self, connection, exam_schedule_id):
+        self.refresh_by(connection, "ExamScheduleID", exam_schedule_id)
+
+    def refresh_by(self, connection, column, value):
+        """Reload every card whose `column` (a key of INDEXED) is value, dropping those that no longer join."""
+        with self._lock:
+            stale = list(self._index[column].get(value, ()))
+        self._refresh(connection, INDEXED[column], value, stale)
+
+    def refresh_student(self, connection, student_id):
+        with self._lock:
+            stale = [card["AdmitCardID"] for card in self._by_student.get(student_id, ())]
+        self._refresh(connection, "a.StudentID = %s", student_id, stale)
+
+    def remove_card(self, admit_card_id):
+        with self._lock:
+            self._remove(admit_card_id)
+
+    def _refresh(self, connection, condition, value, stale_card_ids):
+        cursor = connection.cursor()
+        try:
+            cursor.execute(VIEW_QUERY + " WHERE " + condition, (value,))
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+        with self._lock:
+            for admit_card_id in stale_card_ids:
+                self._remove(admit_card_id)
+            for row in rows:
+                card = to_card(row)
+                self._remove(card["AdmitCardID"])
+                self._cards[card["AdmitCardID"]] = card
+                for column, by_value in self._index.items():
+                    by_value.setdefault(card[column], set()).add(card["AdmitCardID"])
+                cards = list(self._by_student.get(card["StudentID"], ()))
+                cards.append(card)
+                self._by_student[card["StudentID"]] = _sorted(cards)
+
+    def _remove(self, admit_card_id):
+        card = self._cards.pop(admit_card_id, None)
+        if card is None:
+            return
+        for column, by_value in self._index.items():
+            card_ids = by_value.get(card[column])
+            if card_ids is not None:
+                card_ids.discard(admit_card_id)
+                if not card_ids:
+                    del by_value[card[column]]
+        remaining = [c for c in self._by_student.get(card["StudentID"], ()) if c["AdmitCardID"] != admit_card_id]
+        if remaining:
+            self._by_student[card["StudentID"]] = remaining
+        else:
+            self._by_student.pop(card["StudentID"], None)
+
+
+def _sorted(cards):
+    return sorted(cards, key=lambda card: (card["ExamDate"] or "", card["ExamTime"] or "", card["AdmitCardID"]))
+
+
+admit_card_view = AdmitCardView()
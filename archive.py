@@ -0,0 +1,167 @@
+"""Admission-cycle archival into <Table>Archive tables.
+
+A cycle is closed by date: an application belongs to a closed cycle
+when it has payment or admit-card activity and all of it is dated
+before `closed_before`.  Those applications move to ApplicationArchive
+together with their Payment and AdmitCard rows, one small chunk per
+transaction: the chunk is selected with a plain (non-locking) read,
+copied with INSERT ... SELECT and deleted by primary key, so only the
+moved rows are ever locked.  A copy/delete count mismatch raises
+ArchiveConflict and the chunk is rolled back rather than deleting rows
+that were not archived.  Results then follow for students who
+have archived applications and no live ones left.
+
+IDs are client-supplied and the insert routes reject archived ones, but
+a row that reused an archived ID anyway (a worker whose index had not
+caught up, or a direct insert) is left live rather than failing the
+INSERT into the archive on every later run.
+"""
+import threading
+import time
+import uuid
+
+import database
+
+ARCHIVE_TABLES = {
+    "Application": "ApplicationID",
+    "Payment": "PaymentID",
+    "AdmitCard": "AdmitCardID",
+    "Result": "ResultID",
+}
+DEFAULT_CHUNK_SIZE = 500
+PAUSE_BETWEEN_CHUNKS_SECONDS = 0.05
+
+CLOSED_APPLICATIONS_QUERY = """
+    SELECT a.ApplicationID FROM Application a
+    WHERE a.ApplicationID > %s
+      AND (EXISTS (SELECT 1 FROM Payment p WHERE p.ApplicationID = a.ApplicationID)
+           OR EXISTS (SELECT 1 FROM AdmitCard ac WHERE ac.ApplicationID = a.ApplicationID))
+      AND NOT EXISTS (SELECT 1 FROM Payment p
+                      WHERE p.ApplicationID = a.ApplicationID AND p.PaymentDate >= %s)
+      AND NOT EXISTS (SELECT 1 FROM AdmitCard ac
+                      WHERE ac.ApplicationID = a.ApplicationID AND ac.AdmitDate >= %s)
+      AND NOT EXISTS (SELECT 1 FROM ApplicationArchive aa WHERE aa.ApplicationID = a.ApplicationID)
+      AND NOT EXISTS (SELECT 1 FROM Payment p JOIN PaymentArchive pa ON pa.PaymentID = p.PaymentID
+                      WHERE p.ApplicationID = a.ApplicationID)
+      AND NOT EXISTS (SELECT 1 FROM AdmitCard ac JOIN AdmitCardArchive aca ON aca.AdmitCardID = ac.AdmitCardID
+                      WHERE ac.ApplicationID = a.ApplicationID)
+    ORDER BY a.ApplicationID
+    LIMIT %s
+"""
+CLOSED_RESULTS_QUERY = """
+    SELECT r.ResultID FROM Result r
+    WHERE r.ResultID > %s
+      AND EXISTS (SELECT 1 FROM ApplicationArchive aa WHERE aa.StudentID = r.StudentID)
+      AND NOT EXISTS (SELECT 1 FROM Application a WHERE a.StudentID = r.StudentID)
+      AND NOT EXISTS (SELECT 1 FROM ResultArchive ra WHERE ra.ResultID = r.ResultID)
+    ORDER BY r.ResultID
+    LIMIT %s
+"""
+
+jobs = {}
+_jobs_lock = threading.Lock()
+
+
+class ArchiveConflict(Exception):
+    pass
+
+
+def ensure_archive_tables(cursor):
+    for table in ARCHIVE_TABLES:
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table}Archive LIKE {table}")
+
+
+def move_rows(cursor, table, column, ids):
+    placeholders = ", ".join(["%s"] * len(ids))
+    cursor.execute(f"INSERT INTO {table}Archive SELECT * FROM {table} WHERE {column} IN ({placeholders})", ids)
+    copied = cursor.rowcount
+    cursor.execute(f"DELETE FROM {table} WHERE {column} IN ({placeholders})", ids)
+    if cursor.rowcount != copied:
+        raise ArchiveConflict(f"{table}: copied {copied} rows to {table}Archive but deleted {cursor.rowcount}")
+    return copied
+
+
+def archive_cycle(job, closed_before, chunk_size=DEFAULT_CHUNK_SIZE):
+    connection = database.get_connection()
+    cursor = connection.cursor()
+    try:
+        ensure_archive_tables(cursor)
+        connection.commit()
+
+        last_id = -1
+        while True:
+            cursor.execute(CLOSED_APPLICATIONS_QUERY, (last_id, closed_before, closed_before, chunk_size))
+            ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                break
+            placeholders = ", ".join(["%s"] * len(ids))
+            for table, column in (("Payment", "PaymentID"), ("AdmitCard", "AdmitCardID")):
+                cursor.execute(f"SELECT {column} FROM {table} WHERE ApplicationID IN ({placeholders})", ids)
+                child_ids = [row[0] for row in cursor.fetchall()]
+                if child_ids:
+                    job["Moved"][table] += move_rows(cursor, table, column, child_ids)
+            job["Moved"]["Application"] += move_rows(cursor, "Application", "ApplicationID", ids)
+            connection.commit()
+            last_id = ids[-1]
+            job["Chunks"] += 1
+            time.sleep(PAUSE_BETWEEN_CHUNKS_SECONDS)
+
+        last_id = -1
+        while True:
+            cursor.execute(CLOSED_RESULTS_QUERY, (last_id, chunk_size))
+            ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                break
+            job["Moved"]["Result"] += move_rows(cursor, "Result", "ResultID", ids)
+            connection.commit()
+            last_id = ids[-1]
+            job["Chunks"] += 1
+            time.sleep(PAUSE_BETWEEN_CHUNKS_SECONDS)
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def new_job(closed_before):
+    job = {
+        "JobID": uuid.uuid4().hex,
+        "ClosedBefore": closed_before,
+        "Status": "running",
+        "Chunks": 0,
+        "Moved": dict.fromkeys(ARCHIVE_TABLES, 0),
+        "StartedAt": time.time(),
+        "FinishedAt": None,
+        "Error": None,
+    }
+    with _jobs_lock:
+        jobs[job["JobID"]] = job
+    return job
+
+
+def run_job(job, chunk_size=DEFAULT_CHUNK_SIZE):
+    try:
+        archive_cycle(job, job["ClosedBefore"], chunk_size)
+        job["Status"] = "finished"
+    except Exception as e:
+        job["Status"] = "failed"
+        job["Error"] = str(e)
+    finally:
+        job["FinishedAt"] = time.time()
+    return job
+
+
+def fetch_archived(table, after, limit):
+    column = ARCHIVE_TABLES[table]
+    connection = database.get_read_connection()
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"SELECT * FROM {table}Archive WHERE {column} > %s ORDER BY {column} LIMIT %s",
+                       (after, limit))
+        columns = [description[0] for description in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+        connection.close()
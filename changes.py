@@ -0,0 +1,324 @@
+"""Ordered change feed behind /api/changes, shared by every worker.
+
+Every write route appends one row to the ChangeFeed table inside its
+own transaction (`stage`), so the row commits or rolls back with the
+change and costs no extra commit.  The row's AUTO_INCREMENT ChangeID is the cursor (the column is
+not named Cursor, a reserved word in MySQL), so a cursor names the
+same position on every worker and across restarts.  Each worker keeps
+the recent tail in memory: its own entries are added as they are
+recorded, other workers' arrive over the invalidation bus, and a repair
+loop reads ChangeFeed past the worker's watermark every
+REPAIR_INTERVAL_SECONDS to recover messages the bus dropped.
+
+Entries are served only up to the watermark, the highest cursor below
+which nothing is missing, so a client never steps over an entry that
+has not arrived yet.  A cursor that is still missing after
+HOLE_GRACE_SECONDS is taken to be an id MySQL skipped (a rolled-back
+insert) and passed over.  A cursor older than the in-memory tail is told
+to `reset` (refetch once).
+"""
+import asyncio
+import bisect
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+import database
+
+logger = logging.getLogger(__name__)
+
+MAX_ENTRIES = 100000
+REPAIR_INTERVAL_SECONDS = 1.0
+REPAIR_BATCH = 1000
+HOLE_GRACE_SECONDS = 5.0
+# ChangeFeed rows kept in MySQL; older rows are pruned by the repair loop
+RETAIN_ROWS = 1000000
+PRUNE_INTERVAL_SECONDS = 60
+
+# ChangeIDs below a rebuild's high-water mark checked one by one for visibility
+HORIZON_WINDOW = 10000
+
+# Identifies this worker's own rows when the repair loop reads them back
+ORIGIN = f"{socket.gethostname()}:{os.getpid()}"
+
+CREATE_FEED_QUERY = """
+    CREATE TABLE IF NOT EXISTS ChangeFeed (
+        ChangeID BIGINT AUTO_INCREMENT PRIMARY KEY,
+        Origin VARCHAR(128) NOT NULL,
+        Message JSON NOT NULL,
+        At DOUBLE NOT NULL
+    )
+"""
+
+
+def to_entry(cursor, message, at):
+    return {
+        "Cursor": cursor,
+        "Table": message["table"],
+        "Op": message["op"],
+        "Key": message["key"],
+        "Data": message.get("data"),
+        "At": at,
+    }
+
+
+class ChangeLog:
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._cursors = []
+        self._entries = []
+        self._pending = {}
+        self._watermark = None
+        self._gap_since = None
+        self._new_entry = None
+        self._loop = None
+        # Sync write routes run in the threadpool and record from there
+        self._lock = threading.Lock()
+        self.holes_skipped = 0
+        self.repaired = 0
+
+    @property
+    def latest(self):
+        return self._watermark or 0
+
+    def load(self, connection, tail=MAX_ENTRIES):
+        """Create ChangeFeed if needed and seed the tail and watermark from it."""
+        cursor = connection.cursor()
+        try:
+            cursor.execute(CREATE_FEED_QUERY)
+            connection.commit()
+            cursor.execute("SELECT ChangeID, Message, At FROM ChangeFeed ORDER BY ChangeID DESC LIMIT %s", (tail,))
+            rows = cursor.fetchall()
+            cursor.execute("SELECT COALESCE(MAX(ChangeID), 0) FROM ChangeFeed")
+            watermark = cursor.fetchall()[0][0]
+        finally:
+            cursor.close()
+        rows.reverse()
+        with self._lock:
+            self._cursors = [row[0] for row in rows]
+            self._entries = [to_entry(row[0], _decode(row[1]), row[2]) for row in rows]
+            self._watermark = watermark
+            self._pending = {c: entry for c, entry in self._pending.items() if c > watermark}
+            self._advance()
+
+    def add(self, entry):
+        """Add an entry by cursor; return False if it was already known."""
+        cursor = entry["Cursor"]
+        with self._lock:
+            if cursor in self._pending or self._in_tail(cursor):
+                return False
+            if self._watermark is not None and cursor <= self._watermark:
+                # Arrived after its slot was given up as a hole; too late for the feed
+                logger.warning("Change %s arrived after its cursor was skipped", cursor)
+                return True
+            self._pending[cursor] = entry
+            advanced = self._advance()
+        if advanced:
+            self._notify()
+        return True
+
+    def since(self, cursor, limit):
+        """Return (entries after cursor, reset flag)."""
+        with self._lock:
+            if self._watermark is None or cursor >= self._watermark:
+                # Not loaded yet, or the client is ahead of this worker: wait
+                return [], False
+            if not self._cursors or cursor < self._cursors[0] - 1:
+                return [], True
+            start = bisect.bisect_right(self._cursors, cursor)
+            return self._entries[start:start + limit], False
+
+    async def wait(self, cursor, limit, timeout):
+        entries, reset = self.since(cursor, limit)
+        if entries or reset or timeout <= 0:
+            return entries, reset
+        with self._lock:
+            if self._new_entry is None:
+                self._loop = asyncio.get_running_loop()
+                self._new_entry = asyncio.Event()
+            new_entry = self._new_entry
+        try:
+            await asyncio.wait_for(new_entry.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.since(cursor, limit)
+
+    def fetch_missing(self, connection):
+        """Read ChangeFeed rows past the watermark that this worker has not seen."""
+        if self._watermark is None:
+            return []
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT ChangeID, Origin, Message, At FROM ChangeFeed WHERE ChangeID > %s "
+                           "ORDER BY ChangeID LIMIT %s", (self._watermark, REPAIR_BATCH))
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+        with self._lock:
+            return [(c, origin, message, at) for c, origin, message, at in rows if c not in self._pending]
+
+    def skip_holes(self):
+        with self._lock:
+            if not self._pending or self._gap_since is None:
+                return
+            if time.time() - self._gap_since < HOLE_GRACE_SECONDS:
+                return
+            self.holes_skipped += min(self._pending) - self._watermark - 1
+            self._watermark = min(self._pending) - 1
+            advanced = self._advance()
+        if advanced:
+            self._notify()
+
+    def prune(self, connection):
+        cursor = connection.cursor()
+        try:
+            cursor.execute("DELETE FROM ChangeFeed WHERE ChangeID <= %s LIMIT 10000",
+                           (self.latest - RETAIN_ROWS,))
+            connection.commit()
+        finally:
+            cursor.close()
+
+    def stats(self):
+        with self._lock:
+            return {"Watermark": self._watermark, "Entries": len(self._entries), "Pending": len(self._pending),
+                    "HolesSkipped": self.holes_skipped, "Repaired": self.repaired}
+
+    def _in_tail(self, cursor):
+        index = bisect.bisect_left(self._cursors, cursor)
+        return index < len(self._cursors) and self._cursors[index] == cursor
+
+    def _advance(self):
+        if self._watermark is None:
+            return False
+        advanced = False
+        while self._watermark + 1 in self._pending:
+            self._watermark += 1
+            self._cursors.append(self._watermark)
+            self._entries.append(self._pending.pop(self._watermark))
+            advanced = True
+        for stale in [c for c in self._pending if c <= self._watermark]:
+            del self._pending[stale]
+        if len(self._entries) > 2 * self.max_entries:
+            del self._cursors[:-self.max_entries]
+            del self._entries[:-self.max_entries]
+        if not self._pending:
+            self._gap_since = None
+        elif advanced or self._gap_since is None:
+            self._gap_since = time.time()
+        return advanced
+
+    def _notify(self):
+        with self._lock:
+            new_entry, self._new_entry = self._new_entry, None
+        if new_entry is not None:
+            self._loop.call_soon_threadsafe(new_entry.set)
+
+
+def stage(cursor, table, op, key, data=None, deltas=None):
+    """Insert the ChangeFeed row through the caller's cursor, uncommitted; return the bus message.
+
+    The caller commits it with its own write and then hands the message to
+    `change_log.add` and the bus.
+    """
+    message = {
+        "table": table,
+        "op": op,
+        "key": key,
+        "data": jsonable_encoder(data) if data is not None else None,
+        "deltas": deltas,
+    }
+    at = time.time()
+    cursor.execute("INSERT INTO ChangeFeed (Origin, Message, At) VALUES (%s, %s, %s)",
+                   (ORIGIN, json.dumps(message, default=str), at))
+    message["cursor"] = cursor.lastrowid
+    message["at"] = at
+    return message
+
+
+class Horizon:
+    """The changes a consistent-snapshot read already saw.
+
+    ChangeIDs are handed out at INSERT, not at commit, so a snapshot can
+    miss an id below its high-water mark whose transaction was still
+    open; those ids are kept in `invisible`.  Ids more than HORIZON_WINDOW
+    below the mark are taken as seen.
+    """
+
+    def __init__(self, high_water, invisible):
+        self.high_water = high_water
+        self.invisible = invisible
+
+    def contains(self, change_id):
+        return change_id is not None and change_id <= self.high_water and change_id not in self.invisible
+
+
+def read_horizon(cursor):
+    """Read the Horizon of the caller's consistent-snapshot transaction, through its cursor."""
+    cursor.execute("SELECT COALESCE(MAX(ChangeID), 0) FROM ChangeFeed")
+    high_water = cursor.fetchall()[0][0]
+    cursor.execute("SELECT ChangeID FROM ChangeFeed WHERE ChangeID > %s", (high_water - HORIZON_WINDOW,))
+    visible = {row[0] for row in cursor.fetchall()}
+    invisible = set(range(max(high_water - HORIZON_WINDOW, 0) + 1, high_water + 1)) - visible
+    return Horizon(high_water, invisible)
+
+
+def _decode(message):
+    return json.loads(message) if isinstance(message, (str, bytes, bytearray)) else message
+
+
+change_log = ChangeLog()
+
+
+def record(table, op, key, data=None, deltas=None):
+    """Append a write that has no transaction of its own to ChangeFeed; return the bus message."""
+    connection = database.get_connection()
+    try:
+        cursor = connection.cursor()
+        try:
+            message = stage(cursor, table, op, key, data, deltas)
+            connection.commit()
+        finally:
+            cursor.close()
+    finally:
+        connection.close()
+    return message
+
+
+def load():
+    connection = database.get_connection()
+    try:
+        change_log.load(connection)
+    finally:
+        connection.close()
+
+
+async def repair_forever(dispatch):
+    """Feed ChangeFeed rows the bus never delivered through dispatch(message), then skip old holes."""
+    loop = asyncio.get_running_loop()
+    last_pruned = time.monotonic()
+    while True:
+        await asyncio.sleep(REPAIR_INTERVAL_SECONDS)
+        try:
+            connection = await loop.run_in_executor(None, database.get_connection)
+            try:
+                rows = await loop.run_in_executor(None, change_log.fetch_missing, connection)
+                if time.monotonic() - last_pruned > PRUNE_INTERVAL_SECONDS:
+                    last_pruned = time.monotonic()
+                    await loop.run_in_executor(None, change_log.prune, connection)
+            finally:
+                connection.close()
+            for cursor, origin, message, at in rows:
+                message = dict(_decode(message), cursor=cursor, at=at)
+                if origin == ORIGIN:
+                    change_log.add(to_entry(cursor, message, at))
+                elif change_log.add(to_entry(cursor, message, at)):
+                    change_log.repaired += 1
+                    dispatch(message)
+            change_log.skip_holes()
+        except Exception:
+            logger.exception("Change feed repair failed")
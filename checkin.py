@@ -0,0 +1,179 @@
+"""Signed admit-card tokens for DB-free exam-hall check-in.
+
+A token packs AdmitCardID, StudentID, ExamScheduleID and VenueID into
+17 bytes (with a version byte) followed by a truncated HMAC-SHA256 tag,
+base64url-encoded to 44 characters.  Verifying it needs only the shared
+secret, so invigilators' scans never wait on MySQL.  Accepted check-ins
+are queued and written to the Attendance table in batches by a
+background task.
+
+Every worker must share CHECKIN_SECRET; without it tokens are neither
+issued nor verified.  The four IDs must fit in an unsigned 32-bit int;
+a card whose IDs do not is simply issued no token.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import struct
+import time
+
+import database
+
+logger = logging.getLogger(__name__)
+
+TOKEN_VERSION = 1
+TAG_BYTES = 16
+_PAYLOAD = struct.Struct(">BIIII")
+TOKEN_LENGTH = len(base64.urlsafe_b64encode(bytes(_PAYLOAD.size + TAG_BYTES)).rstrip(b"="))
+MAX_ID = 2 ** 32 - 1
+
+SECRET = os.environ.get("CHECKIN_SECRET", "").encode()
+if not SECRET:
+    logger.warning("CHECKIN_SECRET is not set; check-in tokens are disabled")
+
+
+class CheckinDisabled(Exception):
+    pass
+
+
+ATTENDANCE_FLUSH_SECONDS = 1.0
+ATTENDANCE_MAX_BATCH = 1000
+CREATE_ATTENDANCE_QUERY = """
+    CREATE TABLE IF NOT EXISTS Attendance (
+        AdmitCardID INT PRIMARY KEY,
+        StudentID INT NOT NULL,
+        ExamScheduleID INT NOT NULL,
+        VenueID INT NOT NULL,
+        CheckedInAt DATETIME NOT NULL
+    )
+"""
+
+
+def _tag(payload):
+    return hmac.new(SECRET, payload, hashlib.sha256).digest()[:TAG_BYTES]
+
+
+def enabled():
+    return bool(SECRET)
+
+
+def issue_token(admit_card_id, student_id, exam_schedule_id, venue_id):
+    """Return a signed token; raise CheckinDisabled without a secret, ValueError for unpackable IDs."""
+    if not SECRET:
+        raise CheckinDisabled("CHECKIN_SECRET is not set")
+    ids = (admit_card_id, student_id, exam_schedule_id, venue_id)
+    if not all(isinstance(value, int) and 0 <= value <= MAX_ID for value in ids):
+        raise ValueError(f"Token IDs must be integers between 0 and {MAX_ID}")
+    payload = _PAYLOAD.pack(TOKEN_VERSION, *ids)
+    return base64.urlsafe_b64encode(payload + _tag(payload)).rstrip(b"=").decode()
+
+
+def issue_for_card(card):
+    # Called after the card is committed, so anything that cannot be signed just gets no token
+    if card is None or card["VenueID"] is None or not SECRET:
+        return None
+    try:
+        return issue_token(card["AdmitCardID"], card["StudentID"], card["ExamScheduleID"], card["VenueID"])
+    except ValueError:
+        logger.warning("No check-in token for AdmitCard %s: IDs do not fit the token", card["AdmitCardID"])
+        return None
+
+
+def verify_token(token):
+    """Return the decoded fields; raise CheckinDisabled without a secret, ValueError for a bad token."""
+    if not SECRET:
+        raise CheckinDisabled("CHECKIN_SECRET is not set")
+    if len(token) != TOKEN_LENGTH:
+        raise ValueError("Malformed token")
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except (ValueError, TypeError):
+        raise ValueError("Malformed token")
+    if len(raw) != _PAYLOAD.size + TAG_BYTES:
+        raise ValueError("Malformed token")
+    payload, tag = raw[:_PAYLOAD.size], raw[_PAYLOAD.size:]
+    if not hmac.compare_digest(tag, _tag(payload)):
+        raise ValueError("Invalid signature")
+    version, admit_card_id, student_id, exam_schedule_id, venue_id = _PAYLOAD.unpack(payload)
+    if version != TOKEN_VERSION:
+        raise ValueError("Unsupported token version")
+    return {
+        "AdmitCardID": admit_card_id,
+        "StudentID": student_id,
+        "ExamScheduleID": exam_schedule_id,
+        "VenueID": venue_id,
+    }
+
+
+class AttendanceWriter:
+    def __init__(self):
+        self._queue = []
+        self._seen = set()
+        self._task = None
+        self._table_ready = False
+        self.written = 0
+        self.failed_batches = 0
+
+    def record(self, card):
+        """Queue a check-in; return False if this worker already saw the card."""
+        if card["AdmitCardID"] in self._seen:
+            return False
+        self._seen.add(card["AdmitCardID"])
+        self._queue.append((card["AdmitCardID"], card["StudentID"], card["ExamScheduleID"], card["VenueID"],
+                            time.strftime("%Y-%m-%d %H:%M:%S")))
+        return True
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def stats(self):
+        return {"Queued": len(self._queue), "Written": self.written, "FailedBatches": self.failed_batches}
+
+    async def flush(self):
+        while self._queue:
+            batch, self._queue = self._queue[:ATTENDANCE_MAX_BATCH], self._queue[ATTENDANCE_MAX_BATCH:]
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self._write, batch)
+                self.written += len(batch)
+            except Exception:
+                # Keep the check-ins and retry on the next tick
+                self.failed_batches += 1
+                self._queue = batch + self._queue
+                logger.exception("Attendance write-back failed for %s check-ins", len(batch))
+                return
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(ATTENDANCE_FLUSH_SECONDS)
+            await self.flush()
+
+    def _write(self, batch):
+        connection = database.get_connection()
+        cursor = connection.cursor()
+        try:
+            if not self._table_ready:
+                cursor.execute(CREATE_ATTENDANCE_QUERY)
+                self._table_ready = True
+            rows = ", ".join(["(%s, %s, %s, %s, %s)"] * len(batch))
+            cursor.execute(
+                "INSERT IGNORE INTO Attendance (AdmitCardID, StudentID, ExamScheduleID, VenueID, CheckedInAt) "
+                "VALUES " + rows,
+                [value for row in batch for value in row]
+            )
+            connection.commit()
+        finally:
+            cursor.close()
+            connection.close()
+
+
+attendance = AttendanceWriter()
@@ -0,0 +1,165 @@
+"""Materialized application counters per (UnitID, StatusID).
+
+The application and unit write routes adjust the counters in place, so
+`/api/dashboard/units` never scans the Application table.  A periodic
+reconciliation recounts from MySQL and corrects any drift left behind by
+writes that bypassed the API.
+
+A recount runs in a consistent snapshot together with `changes.read_horizon`,
+so deltas journaled while it runs are replayed only for changes the
+snapshot did not see, and a late delta for a change it did see (from the
+bus or the repair loop) is dropped.
+"""
+import asyncio
+import logging
+import threading
+import time
+
+import changes
+import database
+
+logger = logging.getLogger(__name__)
+
+# StatusIDs that occupy a seat.  None counts every application.
+SEAT_STATUS_IDS = None
+RECONCILE_INTERVAL_SECONDS = 300
+
+COUNT_QUERY = "SELECT UnitID, StatusID, COUNT(*) FROM Application GROUP BY UnitID, StatusID"
+CAPACITY_QUERY = "SELECT UnitID, MaxCapacity FROM Unit"
+
+
+class UnitCounters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._counts = {}
+        self._capacity = {}
+        # Deltas applied while a rebuild's SELECT runs, replayed onto its result
+        self._journal = None
+        # Changes the last recount already counted
+        self._horizon = None
+        self.last_reconciled = None
+        self.last_drift = 0
+
+    def apply(self, unit_id, status_id, delta, change_id=None):
+        if unit_id is None:
+            return
+        with self._lock:
+            if self._counted(change_id):
+                return
+            if self._journal is not None:
+                self._journal.append((self.apply, (unit_id, status_id, delta, change_id)))
+            key = (unit_id, status_id)
+            count = self._counts.get(key, 0) + delta
+            if count:
+                self._counts[key] = count
+            else:
+                self._counts.pop(key, None)
+
+    def set_capacity(self, unit_id, max_capacity, change_id=None):
+        with self._lock:
+            if self._counted(change_id):
+                return
+            if self._journal is not None:
+                self._journal.append((self.set_capacity, (unit_id, max_capacity, change_id)))
+            self._capacity[unit_id] = max_capacity
+
+    def remove_unit(self, unit_id, change_id=None):
+        with self._lock:
+            if self._counted(change_id):
+                return
+            if self._journal is not None:
+                self._journal.append((self.remove_unit, (unit_id, change_id)))
+            self._capacity.pop(unit_id, None)
+
+    def units(self):
+        with self._lock:
+            counts = list(self._counts.items())
+            capacity = dict(self._capacity)
+
+        units = {
+            unit_id: {"UnitID": unit_id, "MaxCapacity": max_capacity, "Applications": 0, "ByStatus": {}}
+            for unit_id, max_capacity in capacity.items()
+        }
+        seats_taken = dict.fromkeys(units, 0)
+        for (unit_id, status_id), count in counts:
+            unit = units.get(unit_id)
+            if unit is None:
+                unit = units[unit_id] = {"UnitID": unit_id, "MaxCapacity": None, "Applications": 0, "ByStatus": {}}
+            unit["Applications"] += count
+            unit["ByStatus"][status_id] = count
+            if SEAT_STATUS_IDS is None or status_id in SEAT_STATUS_IDS:
+                seats_taken[unit_id] = seats_taken.get(unit_id, 0) + count
+
+        for unit_id, unit in units.items():
+            if unit["MaxCapacity"] is not None:
+                unit["SeatsRemaining"] = unit["MaxCapacity"] - seats_taken.get(unit_id, 0)
+            else:
+                unit["SeatsRemaining"] = None
+        return sorted(units.values(), key=lambda unit: unit["UnitID"])
+
+    def rebuild(self, connection):
+        with self._rebuild_lock:
+            return self._rebuild(connection)
+
+    def _rebuild(self, connection):
+        with self._lock:
+            self._journal = []
+        cursor = connection.cursor()
+        try:
+            connection.start_transaction(consistent_snapshot=True, readonly=True)
+            horizon = changes.read_horizon(cursor)
+            cursor.execute(COUNT_QUERY)
+            counts = {(unit_id, status_id): count for unit_id, status_id, count in cursor.fetchall()}
+            cursor.execute(CAPACITY_QUERY)
+            capacity = dict(cursor.fetchall())
+            connection.commit()
+        except Exception:
+            with self._lock:
+                self._journal = None
+            raise
+        finally:
+            cursor.close()
+
+        with self._lock:
+            journal, self._journal = self._journal, None
+            # Drift is measured before replaying, against what the deltas had reached
+            drift = sum(
+                abs(counts.get(key, 0) - self._counts.get(key, 0))
+                for key in set(counts) | set(self._counts)
+            )
+            self._counts = counts
+            self._capacity = capacity
+            self._horizon = horizon
+            self.last_reconciled = time.time()
+            self.last_drift = drift
+        # Journaled deltas the recount already counted are skipped by the horizon
+        for method, args in journal:
+            method(*args)
+        return drift
+
+    def _counted(self, change_id):
+        return self._horizon is not None and self._horizon.contains(change_id)
+
+
+unit_counters = UnitCounters()
+
+
+def reconcile():
+    connection = database.get_connection()
+    try:
+        return unit_counters.rebuild(connection)
+    finally:
+        connection.close()
+
+
+async def reconcile_forever():
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(RECONCILE_INTERVAL_SECONDS)
+        try:
+            drift = await loop.run_in_executor(None, reconcile)
+            if drift:
+                logger.warning("Unit counters drifted by %s applications; corrected", drift)
+        except Exception:
+            logger.exception("Unit counter reconciliation failed")
@@ -1,16 +1,141 @@
+import contextvars
+import itertools
+import os
+import threading
+import time
+
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, pooling
+from mysql.connector.errors import PoolError
+
+PRIMARY = {
+    'host': 'localhost',
+    'user': 'root',
+    'password': 'mysql',
+    'database': 'university_admission_system'
+}
+
+# Read replicas as "host:port" pairs, e.g. DB_REPLICAS=127.0.0.1:3307,127.0.0.1:3308
+REPLICAS = [
+    {'host': host, 'port': int(port or 3306)}
+    for host, _, port in (item.strip().partition(':') for item in os.environ.get('DB_REPLICAS', '').split(','))
+    if host
+]
+REPLICA_STRATEGY = os.environ.get('DB_REPLICA_STRATEGY', 'round_robin')  # or 'least_busy'
+
+# Reads within this many seconds of a write in the same session go to the primary
+READ_YOUR_WRITES_SECONDS = 5
+
+# Primary connections opened up front by open_pool(); mysql.connector allows at most 32
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+
+_primary_until = contextvars.ContextVar('primary_until', default=0.0)
+_round_robin = itertools.count()
+_replica_lock = threading.Lock()
+_replica_busy = [0] * len(REPLICAS)
+_pool = None
+_pool_overflow = 0
+
+
+def open_pool(size=None):
+    global _pool
+    if _pool is None:
+        _pool = pooling.MySQLConnectionPool(pool_name='primary', pool_size=size or POOL_SIZE, **PRIMARY)
+    return _pool
+
+
+def close_pool():
+    global _pool
+    _pool = None
+
+
+def pool_stats():
+    return {'PoolSize': _pool.pool_size if _pool is not None else 0, 'Overflow': _pool_overflow}
 
 
 def get_connection():
+    global _pool_overflow
+    if _pool is not None:
+        try:
+            return _pool.get_connection()
+        except PoolError:
+            # Every pooled connection is checked out; open a dedicated one
+            _pool_overflow += 1
     try:
-        connection = mysql.connector.connect(
-        host='localhost',
-        user='root',
-        password='mysql',
-        database='university_admission_system'
-        )
+        connection = mysql.connector.connect(**PRIMARY)
 
         return connection
     except Error as err:
-        raise err
\ No newline at end of file
+        raise err
+
+
+def get_read_connection():
+    if not REPLICAS or pinned_to_primary():
+        return get_connection()
+
+    index = _pick_replica()
+    try:
+        connection = mysql.connector.connect(**{**PRIMARY, **REPLICAS[index]})
+    except Error:
+        _release_replica(index)
+        return get_connection()
+    return ReplicaConnection(connection, index)
+
+
+def pin_to_primary(until=None):
+    _primary_until.set(until if until is not None else time.time() + READ_YOUR_WRITES_SECONDS)
+
+
+def pinned_to_primary():
+    return time.time() < _primary_until.get()
+
+
+def _pick_replica():
+    with _replica_lock:
+        if REPLICA_STRATEGY == 'least_busy':
+            index = min(range(len(REPLICAS)), key=_replica_busy.__getitem__)
+        else:
+            index = next(_round_robin) % len(REPLICAS)
+        _replica_busy[index] += 1
+        return index
+
+
+def _release_replica(index):
+    with _replica_lock:
+        _replica_busy[index] -= 1
+
+
+def replica_stats():
+    with _replica_lock:
+        return [
+            {'Replica': f"{replica['host']}:{replica['port']}", 'Active': busy}
+            for replica, busy in zip(REPLICAS, _replica_busy)
+        ]
+
+
+class ReplicaConnection:
+    """Wraps a replica connection so closing it frees its least-busy slot."""
+
+    def __init__(self, connection, index):
+        self._connection = connection
+        self._index = index
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def close(self):
+        if self._index is not None:
+            _release_replica(self._index)
+            self._index = None
+        self._connection.close()
+
+
+def kill_query(connection):
+    # KILL QUERY must run on the server that owns the connection, which may be a replica
+    killer = mysql.connector.connect(**{**PRIMARY, 'host': connection.server_host, 'port': connection.server_port})
+    try:
+        cursor = killer.cursor()
+        cursor.execute("KILL QUERY %s", (connection.connection_id,))
+        cursor.close()
+    finally:
+        killer.close()
@@ -0,0 +1,163 @@
+"""Cross-worker cache invalidation over local Unix datagram sockets.
+
+Every uvicorn worker binds `<BUS_DIR>/<pid>.sock` at startup.  `publish`
+sends a small JSON message to every other socket in the directory, and
+each receiving worker dispatches it to the handlers subscribed to that
+table (or to "*").  Sockets whose worker has gone away are unlinked on
+the first failed send.  Delivery is best effort: a message that cannot
+be sent because a peer's buffer is full is counted as dropped; every
+message carries its ChangeFeed cursor, and the change feed's repair loop
+reads the rows a worker never received from MySQL and dispatches them.
+A message too large for one datagram is sent as a `truncated` poke and
+left to the same repair path.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import tempfile
+import time
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+BUS_DIR = os.environ.get("INVALIDATION_BUS_DIR",
+                         os.path.join(tempfile.gettempdir(), "university-admission-bus"))
+MAX_MESSAGE_BYTES = 65536
+# Peer sockets are re-listed at most this often instead of on every publish
+PEER_REFRESH_SECONDS = 1.0
+
+_handlers = defaultdict(list)
+_gate = None
+_sock = None
+_path = None
+_peers = []
+_peers_listed_at = 0.0
+_stats = {"Published": 0, "Received": 0, "Dropped": 0}
+
+
+def subscribe(table, handler):
+    """Call handler(message) for remote writes to table; "*" matches every table."""
+    _handlers[table].append(handler)
+
+
+def set_gate(gate):
+    """Only dispatch received messages for which gate(message) is true (e.g. not seen before)."""
+    global _gate
+    _gate = gate
+
+
+def start():
+    global _sock, _path
+    if _sock is not None:
+        return
+    os.makedirs(BUS_DIR, exist_ok=True)
+    _path = os.path.join(BUS_DIR, f"{os.getpid()}.sock")
+    if os.path.exists(_path):
+        os.unlink(_path)
+    _sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    _sock.bind(_path)
+    _sock.setblocking(False)
+    asyncio.get_running_loop().add_reader(_sock.fileno(), _receive)
+
+
+def stop():
+    global _sock, _path
+    if _sock is None:
+        return
+    asyncio.get_running_loop().remove_reader(_sock.fileno())
+    _sock.close()
+    _sock = None
+    try:
+        os.unlink(_path)
+    except FileNotFoundError:
+        pass
+    _path = None
+
+
+def publish(message):
+    """Send a change message ({"table", "op", "key", "data", "cursor", ...}) to every other worker."""
+    if _sock is None:
+        return
+    payload = json.dumps(dict(message, pid=os.getpid()), default=str).encode()
+    if len(payload) > MAX_MESSAGE_BYTES:
+        payload = json.dumps({"pid": os.getpid(), "table": message["table"], "op": message["op"],
+                              "key": None, "cursor": message.get("cursor"), "truncated": True}).encode()
+    _stats["Published"] += 1
+    for path in _peer_paths():
+        try:
+            _sock.sendto(payload, path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            _unlink_stale(path)
+        except OSError:
+            _stats["Dropped"] += 1
+
+
+def _peer_paths():
+    global _peers, _peers_listed_at
+    now = time.monotonic()
+    if now - _peers_listed_at > PEER_REFRESH_SECONDS:
+        _peers = [
+            os.path.join(BUS_DIR, name) for name in os.listdir(BUS_DIR)
+            if name.endswith(".sock") and os.path.join(BUS_DIR, name) != _path
+        ]
+        _peers_listed_at = now
+    return _peers
+
+
+def dispatch(message):
+    for handler in _handlers.get(message["table"], []) + _handlers.get("*", []):
+        try:
+            handler(message)
+        except Exception:
+            logger.exception("Invalidation handler failed for %s", message["table"])
+
+
+def stats():
+    return {"Socket": _path, **_stats}
+
+
+def _unlink_stale(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def _receive():
+    while True:
+        try:
+            payload = _sock.recv(MAX_MESSAGE_BYTES)
+        except (BlockingIOError, InterruptedError):
+            return
+        _stats["Received"] += 1
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            continue
+        if _gate is None or _gate(message):
+            dispatch(message)
+
+
+class Debounced:
+    """Run fn in the executor at most once per delay window, however many messages arrive."""
+
+    def __init__(self, fn, delay_seconds):
+        self._fn = fn
+        self._delay_seconds = delay_seconds
+        self._handle = None
+
+    def __call__(self, message=None):
+        if self._handle is None:
+            self._handle = asyncio.get_running_loop().call_later(self._delay_seconds, self._run)
+
+    def _run(self):
+        self._handle = None
+        asyncio.get_running_loop().run_in_executor(None, self._call)
+
+    def _call(self):
+        try:
+            self._fn()
+        except Exception:
+            logger.exception("Debounced refresh %s failed", getattr(self._fn, "__name__", self._fn))
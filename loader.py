@@ -0,0 +1,110 @@
+"""DataLoader-style batching for primary-key point lookups.
+
+Concurrent `load(key)` calls on the same loader are collected for
+`window_ms`, de-duplicated, and fetched with one `WHERE key IN (...)`
+query.  Each caller gets back the rows for its own key (a list, since a
+Student row joined with ContactNumber can span several rows).  Requests
+pinned to the primary for read-your-writes are batched separately and
+read from the primary.
+"""
+import asyncio
+
+import database
+
+
+class BatchLoader:
+    def __init__(self, query, key_index=0, window_ms=2, max_batch=500):
+        # query has one "{keys}" placeholder for the IN list
+        self.query = query
+        self.key_index = key_index
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self._pending = {False: {}, True: {}}
+        self._timers = {False: None, True: None}
+        self.batches = 0
+        self.loads = 0
+
+    async def load(self, key):
+        self.loads += 1
+        primary = database.pinned_to_primary()
+        pending = self._pending[primary]
+        future = pending.get(key)
+        if future is None:
+            future = pending[key] = asyncio.get_running_loop().create_future()
+            if len(pending) >= self.max_batch:
+                self._flush(primary)
+            elif self._timers[primary] is None:
+                self._timers[primary] = asyncio.get_running_loop().call_later(
+                    self.window_ms / 1000, self._flush, primary)
+        return await asyncio.shield(future)
+
+    def stats(self):
+        return {"Loads": self.loads, "Batches": self.batches}
+
+    def _flush(self, primary):
+        timer = self._timers[primary]
+        if timer is not None:
+            timer.cancel()
+            self._timers[primary] = None
+        batch, self._pending[primary] = self._pending[primary], {}
+        if batch:
+            self.batches += 1
+            asyncio.ensure_future(self._fetch(batch, primary))
+
+    async def _fetch(self, batch, primary):
+        keys = list(batch)
+        try:
+            rows = await asyncio.get_running_loop().run_in_executor(None, self._query, keys, primary)
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_key = {}
+        for row in rows:
+            by_key.setdefault(row[self.key_index], []).append(row)
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(by_key.get(key, []))
+
+    def _query(self, keys, primary):
+        connection = database.get_connection() if primary else database.get_read_connection()
+        cursor = connection.cursor()
+        try:
+            cursor.execute(self.query.format(keys=", ".join(["%s"] * len(keys))), keys)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+            connection.close()
+
+
+loaders = {
+    "Student": BatchLoader("""
+        SELECT s.StudentID, s.Name, s.Age, s.Address, c.ContactNumber
+        FROM Student s LEFT JOIN ContactNumber c ON s.StudentID = c.StudentID
+        WHERE s.StudentID IN ({keys})
+        ORDER BY s.StudentID
+    """),
+    "Application": BatchLoader(
+        "SELECT ApplicationID, StudentID, UnitID, StatusID FROM Application WHERE ApplicationID IN ({keys})"),
+    "Payment": BatchLoader(
+        "SELECT PaymentID, ApplicationID, Amount, PaymentDate FROM Payment WHERE PaymentID IN ({keys})"),
+    "Exam": BatchLoader(
+        "SELECT ExamID, UnitID, ExamName, MaxMarks FROM Exam WHERE ExamID IN ({keys})"),
+    "ExamSchedule": BatchLoader(
+        "SELECT ExamScheduleID, ExamID, ExamDate, ExamTime, VenueID FROM ExamSchedule "
+        "WHERE ExamScheduleID IN ({keys})"),
+    "Result": BatchLoader(
+        "SELECT ResultID, StudentID, ExamID, Marks FROM Result WHERE ResultID IN ({keys})"),
+    "Unit": BatchLoader(
+        "SELECT UnitID, UnitName, MaxCapacity FROM Unit WHERE UnitID IN ({keys})"),
+}
+
+
+async def load(table, key):
+    return await loaders[table].load(key)
+
+
+def stats():
+    return {table: loader.stats() for table, loader in loaders.items()}
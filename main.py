@@ -0,0 +1,184 @@
+"""Application factory.
+
+Run with `uvicorn main:app` (or `uvicorn main:create_app --factory`).
+On startup the lifespan opens the primary connection pool and, in the
+background, warms every in-memory structure the routes read from.  The
+worker reports ready on `/health/ready` only once the warm-up has
+finished, so a load balancer never sends it cold traffic.  Failed steps
+are retried with exponential backoff (finished ones are kept), so a
+database that is briefly unreachable at boot delays readiness instead of
+leaving a live worker that never becomes ready.
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+import admission
+import changes
+import database
+import invalidation
+import revenue
+import router
+import snapshot
+from checkin import attendance
+from dashboard import reconcile, reconcile_forever
+from rankings import ranking_cache
+
+logger = logging.getLogger(__name__)
+
+PRIMARY_COOKIE = "db_primary_until"
+WARMUP_RETRY_INITIAL_SECONDS = 1
+WARMUP_RETRY_MAX_SECONDS = 60
+
+# Reference tables and indexes rebuilt from MySQL before the worker reports ready
+WARMUP_STEPS = {
+    "ChangeFeed": changes.load,
+    "ReferenceIndex": router.refresh_references,
+    "ReferenceRows": router.refresh_reference_rows,
+    "StudentIndex": lambda: router.refresh_student(None),
+    "RevenueSummary": router.refresh_revenue,
+    "UnitCounters": reconcile,
+    "AdmitCardView": router.refresh_admit_cards,
+}
+
+
+async def timed(name, coroutine, timings):
+    started = time.monotonic()
+    result = await coroutine
+    timings[name] = round(time.monotonic() - started, 3)
+    return result
+
+
+async def warm_up_steps(timings):
+    # Steps already in timings finished on an earlier attempt
+    if "ConnectionPool" not in timings:
+        await timed("ConnectionPool", asyncio.to_thread(database.open_pool), timings)
+    # Independent loads, each on its own pooled connection
+    results = await asyncio.gather(*(timed(name, asyncio.to_thread(step), timings)
+                                     for name, step in WARMUP_STEPS.items() if name not in timings),
+                                   return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    await timed("Rankings", ranking_cache.get(), timings)
+
+
+async def warm_up(app):
+    state = app.state.startup
+    delay = WARMUP_RETRY_INITIAL_SECONDS
+    while True:
+        state["Attempts"] += 1
+        try:
+            await warm_up_steps(state["Steps"])
+            state["Error"] = None
+            break
+        except Exception as e:
+            state["Error"] = str(e)
+            logger.exception("Worker warm-up attempt %s failed; retrying in %ss", state["Attempts"], delay)
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, WARMUP_RETRY_MAX_SECONDS)
+    for job in (reconcile_forever(), revenue.reconcile_forever(), snapshot.snapshot_forever(),
+                changes.repair_forever(invalidation.dispatch)):
+        task = asyncio.create_task(job)
+        router.background_tasks.add(task)
+    state["Ready"] = True
+    state["StartupSeconds"] = round(time.monotonic() - state["StartedAt"], 3)
+    logger.info("Worker ready in %.3fs %s", state["StartupSeconds"], state["Steps"])
+
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.startup = {"Ready": False, "StartedAt": time.monotonic(), "StartupSeconds": None,
+                         "Steps": {}, "Error": None, "Attempts": 0}
+    await router.start_invalidation_bus()
+    attendance.start()
+    warmup = asyncio.create_task(warm_up(app))
+    try:
+        yield
+    finally:
+        warmup.cancel()
+        for task in list(router.background_tasks):
+            task.cancel()
+        invalidation.stop()
+        await attendance.stop()
+        database.close_pool()
+
+
+#  Admission Control: per route class concurrency limits with load shedding
+async def admission_control(request: Request, call_next):
+    limiter = admission.limiter_for(request.method, request.url.path)
+    if limiter is None:
+        return await call_next(request)
+    try:
+        await limiter.acquire()
+    except admission.Overloaded as e:
+        return JSONResponse(status_code=503, content={"detail": str(e)},
+                            headers={"Retry-After": str(limiter.retry_after_seconds)})
+    try:
+        response = await call_next(request)
+    except BaseException:
+        limiter.release()
+        raise
+    # call_next returns before a streaming body (the result import) runs, so the slot is held until it ends
+    response.body_iterator = release_after(response.body_iterator, limiter)
+    return response
+
+
+async def release_after(body_iterator, limiter):
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    finally:
+        limiter.release()
+
+
+#  Read/Write Splitting: writes and reads shortly after a write stay on the primary
+async def route_reads(request: Request, call_next):
+    try:
+        primary_until = float(request.cookies.get(PRIMARY_COOKIE, 0))
+    except ValueError:
+        primary_until = 0.0
+    is_write = request.method not in ("GET", "HEAD")
+    if is_write:
+        primary_until = time.time() + database.READ_YOUR_WRITES_SECONDS
+    database.pin_to_primary(primary_until)
+
+    response = await call_next(request)
+    if is_write and response.status_code < 400:
+        response.set_cookie(PRIMARY_COOKIE, f"{primary_until:.3f}",
+                            max_age=database.READ_YOUR_WRITES_SECONDS, httponly=True)
+    return response
+
+
+def create_app():
+    app = FastAPI(lifespan=lifespan)
+    app.middleware("http")(admission_control)
+    app.middleware("http")(route_reads)
+    app.include_router(router.router)
+
+    #  Liveness: the process is up and serving (GET)
+    @app.get("/health/live")
+    async def health_live():
+        return {"status": "alive"}
+
+    #  Readiness: warm-up finished, safe to receive traffic (GET)
+    @app.get("/health/ready")
+    async def health_ready(request: Request):
+        state = request.app.state.startup
+        body = {
+            "status": "ready" if state["Ready"] else "starting",
+            "StartupSeconds": state["StartupSeconds"],
+            "Steps": state["Steps"],
+            "Attempts": state["Attempts"],
+            "Error": state["Error"],
+        }
+        return JSONResponse(status_code=200 if state["Ready"] else 503, content=body)
+
+    return app
+
+
+app = create_app()
@@ -0,0 +1,129 @@
+"""Bulk reconciliation of Payment against Application.
+
+Both tables are streamed once inside one consistent-snapshot read
+transaction and hash-joined in memory on ApplicationID: the Application
+scan builds a dict of payment counts keyed by ID, then each chunk of
+Payment rows is probed against it.  The report groups discrepancies as
+
+- Missing: applications without any payment,
+- Duplicates: applications paid more than once,
+- Orphans: payments whose ApplicationID no longer exists (application
+  deletes do not cascade to Payment).
+
+Each category carries its full count plus the first `sample_limit`
+entries ordered by ID.
+"""
+import threading
+import time
+import uuid
+
+import database
+
+DEFAULT_SAMPLE_LIMIT = 1000
+FETCH_BATCH_SIZE = 10000
+
+APPLICATIONS_QUERY = "SELECT ApplicationID FROM Application"
+PAYMENTS_QUERY = "SELECT PaymentID, ApplicationID, Amount, PaymentDate FROM Payment"
+
+jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def stream(cursor, query, batch_size=FETCH_BATCH_SIZE):
+    cursor.execute(query)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield rows
+
+
+def reconcile_payments(job, sample_limit=DEFAULT_SAMPLE_LIMIT):
+    connection = database.get_read_connection()
+    cursor = connection.cursor()
+    try:
+        connection.start_transaction(consistent_snapshot=True, readonly=True)
+
+        paid = {}
+        for rows in stream(cursor, APPLICATIONS_QUERY):
+            for (application_id,) in rows:
+                paid[application_id] = 0
+        job["Applications"] = len(paid)
+
+        first_payment = {}
+        duplicates = {}
+        orphans = []
+        orphan_count = 0
+        for rows in stream(cursor, PAYMENTS_QUERY):
+            for payment_id, application_id, amount, payment_date in rows:
+                job["Payments"] += 1
+                count = paid.get(application_id)
+                if count is None:
+                    orphan_count += 1
+                    orphans.append({"PaymentID": payment_id, "ApplicationID": application_id,
+                                    "Amount": float(amount), "PaymentDate": str(payment_date)})
+                    if len(orphans) > 2 * sample_limit:
+                        orphans = _smallest(orphans, "PaymentID", sample_limit)
+                    continue
+                paid[application_id] = count + 1
+                if count == 0:
+                    first_payment[application_id] = (payment_id, amount)
+                elif count == 1:
+                    duplicates[application_id] = [first_payment[application_id], (payment_id, amount)]
+                else:
+                    duplicates[application_id].append((payment_id, amount))
+        connection.commit()
+    finally:
+        cursor.close()
+        connection.close()
+
+    missing = sorted(application_id for application_id, count in paid.items() if count == 0)
+    duplicate_ids = sorted(duplicates)
+    return {
+        "Missing": {"Count": len(missing), "ApplicationIDs": missing[:sample_limit]},
+        "Duplicates": {
+            "Count": len(duplicate_ids),
+            "Items": [
+                {
+                    "ApplicationID": application_id,
+                    "PaymentIDs": sorted(payment_id for payment_id, _ in duplicates[application_id]),
+                    "Total": float(sum(amount for _, amount in duplicates[application_id])),
+                }
+                for application_id in duplicate_ids[:sample_limit]
+            ],
+        },
+        "Orphans": {"Count": orphan_count, "Items": _smallest(orphans, "PaymentID", sample_limit)},
+    }
+
+
+def _smallest(items, key, limit):
+    return sorted(items, key=lambda item: item[key])[:limit]
+
+
+def new_job(sample_limit=DEFAULT_SAMPLE_LIMIT):
+    job = {
+        "JobID": uuid.uuid4().hex,
+        "Status": "running",
+        "SampleLimit": sample_limit,
+        "Applications": 0,
+        "Payments": 0,
+        "Report": None,
+        "StartedAt": time.time(),
+        "FinishedAt": None,
+        "Error": None,
+    }
+    with _jobs_lock:
+        jobs[job["JobID"]] = job
+    return job
+
+
+def run_job(job):
+    try:
+        job["Report"] = reconcile_payments(job, job["SampleLimit"])
+        job["Status"] = "finished"
+    except Exception as e:
+        job["Status"] = "failed"
+        job["Error"] = str(e)
+    finally:
+        job["FinishedAt"] = time.time()
+    return job
@@ -0,0 +1,109 @@
+"""Statement deadlines and cancellation of abandoned queries.
+
+Every guarded SELECT runs with MySQL's MAX_EXECUTION_TIME set for its
+session, so the server itself aborts it at the deadline.  While the
+query runs in the executor, the request is polled for a client
+disconnect; when the client goes away the statement is stopped with
+KILL QUERY from a side connection and its connection is released.  A
+KILL QUERY is also issued if the server has not honoured the deadline
+after a short grace period.
+"""
+import asyncio
+import logging
+import time
+
+from fastapi import HTTPException
+from mysql.connector import Error
+
+import database
+
+logger = logging.getLogger(__name__)
+
+# "read": key lookups, pages and small reference tables; "report": full scans and aggregates
+ROUTE_TIMEOUTS_MS = {
+    "read": 2000,
+    "report": 15000,
+}
+DISCONNECT_POLL_SECONDS = 0.25
+KILL_GRACE_SECONDS = 1.0
+
+ER_QUERY_TIMEOUT = 3024
+ER_QUERY_INTERRUPTED = 1317
+
+_stats = {"Started": 0, "TimedOut": 0, "Cancelled": 0}
+
+
+def stats():
+    return dict(_stats, TimeoutsMs=ROUTE_TIMEOUTS_MS)
+
+
+def execute_with_deadline(connection, query, values=None, timeout_ms=None):
+    cursor = connection.cursor()
+    try:
+        if timeout_ms:
+            cursor.execute("SET SESSION MAX_EXECUTION_TIME = %s", (int(timeout_ms),))
+        cursor.execute(query, values)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def fetchall_with_deadline(query, values=None, route_class="report"):
+    """Blocking variant for code already running in the executor (e.g. cached reports)."""
+    connection = database.get_read_connection()
+    try:
+        _stats["Started"] += 1
+        return execute_with_deadline(connection, query, values, ROUTE_TIMEOUTS_MS[route_class])
+    except Error as err:
+        if err.errno == ER_QUERY_TIMEOUT:
+            _stats["TimedOut"] += 1
+        raise
+    finally:
+        connection.close()
+
+
+async def guarded_fetchall(request, query, values=None, route_class="report"):
+    timeout_ms = ROUTE_TIMEOUTS_MS[route_class]
+    loop = asyncio.get_running_loop()
+    # to_thread carries the request's context, so read-your-writes pinning still applies
+    connection = await asyncio.to_thread(database.get_read_connection)
+    _stats["Started"] += 1
+    started = time.monotonic()
+    killed = None
+    task = loop.run_in_executor(None, execute_with_deadline, connection, query, values, timeout_ms)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                break
+            if killed is None and await request.is_disconnected():
+                killed = "Cancelled"
+            elif killed is None and time.monotonic() - started > timeout_ms / 1000 + KILL_GRACE_SECONDS:
+                killed = "TimedOut"
+            else:
+                continue
+            try:
+                await loop.run_in_executor(None, database.kill_query, connection)
+            except Exception:
+                logger.exception("KILL QUERY failed for connection %s", connection.connection_id)
+
+        try:
+            return task.result()
+        except Error as err:
+            if err.errno == ER_QUERY_TIMEOUT or killed == "TimedOut":
+                _stats["TimedOut"] += 1
+                raise HTTPException(status_code=504, detail=f"Query exceeded its {timeout_ms} ms deadline")
+            if err.errno == ER_QUERY_INTERRUPTED and killed == "Cancelled":
+                _stats["Cancelled"] += 1
+                raise HTTPException(status_code=499, detail="Client closed request")
+            raise
+    except asyncio.CancelledError:
+        # The request task itself was cancelled; stop the statement too
+        _stats["Cancelled"] += 1
+        loop.run_in_executor(None, database.kill_query, connection)
+        raise
+    finally:
+        if task.done():
+            connection.close()
+        else:
+            task.add_done_callback(lambda _: connection.close())
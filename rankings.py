@@ -0,0 +1,153 @@
+"""Per-unit cutoff marks and rank lists computed with NumPy.
+
+The Application/Exam/Result join is pulled once into flat arrays.  A
+student's score for a unit is the sum of their marks in that unit's
+exams.  Grouping, sorting, competition ranking and cutoffs for every
+unit are then done in one vectorized pass.  The result is cached until
+a Result, Application, Exam or Unit write invalidates it.
+"""
+import asyncio
+import threading
+
+import numpy as np
+
+import database
+
+MARKS_QUERY = """
+    SELECT a.UnitID, a.StudentID, r.Marks
+    FROM Application a
+    JOIN Exam e ON e.UnitID = a.UnitID
+    JOIN Result r ON r.ExamID = e.ExamID AND r.StudentID = a.StudentID
+"""
+CAPACITY_QUERY = "SELECT UnitID, MaxCapacity FROM Unit"
+
+
+class Rankings:
+    def __init__(self, unit_ids, group_starts, group_counts, capacities, students, scores, ranks):
+        self.unit_ids = unit_ids
+        self.students = students
+        self.scores = scores
+        self.ranks = ranks
+        self._groups = {
+            unit_id: (int(start), int(count), capacity)
+            for unit_id, start, count, capacity in zip(unit_ids, group_starts, group_counts, capacities)
+        }
+
+    def cutoffs(self):
+        result = []
+        for unit_id, (start, count, capacity) in self._groups.items():
+            admitted = count if capacity is None else min(count, capacity)
+            result.append({
+                "UnitID": unit_id,
+                "MaxCapacity": capacity,
+                "Candidates": count,
+                "CutoffMarks": float(self.scores[start + admitted - 1]) if admitted else None,
+            })
+        return result
+
+    def rank_list(self, unit_id, offset, limit):
+        group = self._groups.get(unit_id)
+        if group is None:
+            return None
+        start, count, _ = group
+        lo = start + min(offset, count)
+        hi = start + min(offset + limit, count)
+        return {
+            "UnitID": unit_id,
+            "Candidates": count,
+            "Ranks": [
+                {"Rank": int(rank), "StudentID": int(student_id), "Marks": float(score)}
+                for rank, student_id, score in zip(self.ranks[lo:hi], self.students[lo:hi], self.scores[lo:hi])
+            ],
+        }
+
+
+def compute_rankings(unit_col, student_col, marks_col, capacity):
+    if len(unit_col) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return Rankings([], empty, empty, [], empty, np.empty(0), empty)
+
+    unit_names, unit_codes = np.unique(np.asarray(unit_col, dtype=object), return_inverse=True)
+    students = np.asarray(student_col, dtype=np.int64)
+    marks = np.asarray(marks_col, dtype=np.float64)
+
+    # Collapse (unit, student) pairs, summing marks over the unit's exams
+    base = int(students.max()) + 1
+    pair_keys, pair_index = np.unique(unit_codes.astype(np.int64) * base + students, return_inverse=True)
+    scores = np.bincount(pair_index, weights=marks)
+    pair_units = pair_keys // base
+    pair_students = pair_keys % base
+
+    # Unit ascending, score descending, StudentID ascending
+    order = np.lexsort((pair_students, -scores, pair_units))
+    pair_units = pair_units[order]
+    pair_students = pair_students[order]
+    scores = scores[order]
+
+    positions = np.arange(len(order))
+    new_group = np.r_[True, pair_units[1:] != pair_units[:-1]]
+    group_starts = np.flatnonzero(new_group)
+    group_counts = np.diff(np.r_[group_starts, len(order)])
+    row_group_start = np.repeat(group_starts, group_counts)
+
+    # Competition ranking: ties share the rank of the first row with that score
+    new_score = new_group | np.r_[True, scores[1:] != scores[:-1]]
+    first_of_tie = np.maximum.accumulate(np.where(new_score, positions, 0))
+    ranks = first_of_tie - row_group_start + 1
+
+    group_unit_ids = [unit_names[code] for code in pair_units[group_starts]]
+    capacities = [capacity.get(unit_id) for unit_id in group_unit_ids]
+    return Rankings(group_unit_ids, group_starts, group_counts, capacities, pair_students, scores, ranks)
+
+
+def load_rankings():
+    connection = database.get_read_connection()
+    cursor = connection.cursor()
+    try:
+        cursor.execute(CAPACITY_QUERY)
+        capacity = dict(cursor.fetchall())
+        cursor.execute(MARKS_QUERY)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        connection.close()
+    if rows:
+        unit_col, student_col, marks_col = zip(*rows)
+    else:
+        unit_col = student_col = marks_col = ()
+    return compute_rankings(unit_col, student_col, marks_col, capacity)
+
+
+class RankingCache:
+    def __init__(self):
+        self._rankings = None
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._refresh = None
+
+    def invalidate(self, message=None):
+        with self._lock:
+            self._generation += 1
+            self._rankings = None
+
+    async def get(self):
+        rankings = self._rankings
+        if rankings is not None:
+            return rankings
+        if self._refresh is None:
+            self._refresh = asyncio.ensure_future(self._load())
+        return await asyncio.shield(self._refresh)
+
+    async def _load(self):
+        try:
+            generation = self._generation
+            rankings = await asyncio.get_running_loop().run_in_executor(None, load_rankings)
+            with self._lock:
+                if generation == self._generation:
+                    self._rankings = rankings
+            return rankings
+        finally:
+            self._refresh = None
+
+
+ranking_cache = RankingCache()
@@ -0,0 +1,157 @@
+"""In-memory existence index for IDs referenced by the write routes.
+
+Integer primary keys are kept in growable bitmaps (one bit per ID) and
+UnitID, the only string key, in a plain set.  The index is loaded once
+at startup and maintained by the insert and delete routes (and by
+invalidation messages from other workers), so Application, Payment,
+AdmitCard and Result inserts can reject dangling references without a
+query.  A miss is confirmed against MySQL before it is reported, which
+covers writes another worker made that have not reached this one yet.
+
+The IDs in the <Table>Archive tables are indexed too: IDs are chosen by
+the client, and a live row reusing an archived ID could never be
+archived itself.  Archived rows are never deleted, so a hit there is
+final and needs no MySQL check.
+"""
+import threading
+
+# IDs outside [0, MAX_BITMAP_ID) fall back to a set
+MAX_BITMAP_ID = 1 << 28
+
+REFERENCED_TABLES = {
+    "Student": "StudentID",
+    "Unit": "UnitID",
+    "ApplicationStatus": "StatusID",
+    "Application": "ApplicationID",
+    "Exam": "ExamID",
+    "ExamSchedule": "ExamScheduleID",
+    "ApplicationArchive": "ApplicationID",
+    "PaymentArchive": "PaymentID",
+    "AdmitCardArchive": "AdmitCardID",
+    "ResultArchive": "ResultID",
+}
+STRING_KEYED_TABLES = {"Unit"}
+
+
+class IdBitmap:
+    def __init__(self):
+        self._bits = bytearray()
+        self._overflow = set()
+        self._count = 0
+
+    def __len__(self):
+        return self._count + len(self._overflow)
+
+    def __contains__(self, key):
+        if not 0 <= key < MAX_BITMAP_ID:
+            return key in self._overflow
+        byte = key >> 3
+        return byte < len(self._bits) and bool(self._bits[byte] & (1 << (key & 7)))
+
+    def add(self, key):
+        if not 0 <= key < MAX_BITMAP_ID:
+            self._overflow.add(key)
+            return
+        byte = key >> 3
+        if byte >= len(self._bits):
+            # Grow geometrically so sequential inserts stay amortised O(1)
+            self._bits.extend(bytes(max(byte + 1, 2 * len(self._bits)) - len(self._bits)))
+        mask = 1 << (key & 7)
+        if not self._bits[byte] & mask:
+            self._bits[byte] |= mask
+            self._count += 1
+
+    def discard(self, key):
+        if not 0 <= key < MAX_BITMAP_ID:
+            self._overflow.discard(key)
+            return
+        byte = key >> 3
+        mask = 1 << (key & 7)
+        if byte < len(self._bits) and self._bits[byte] & mask:
+            self._bits[byte] &= ~mask
+            self._count -= 1
+
+    def nbytes(self):
+        return len(self._bits)
+
+
+def _new_set(table):
+    return set() if table in STRING_KEYED_TABLES else IdBitmap()
+
+
+class ReferenceIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sets = {table: _new_set(table) for table in REFERENCED_TABLES}
+        self.loaded = False
+        self.rejected = 0
+        self.confirmed = 0
+
+    def load(self, connection, tables=None, batch_size=50000):
+        for table in tables or REFERENCED_TABLES:
+            keys = _new_set(table)
+            cursor = connection.cursor()
+            try:
+                cursor.execute(f"SELECT {REFERENCED_TABLES[table]} FROM {table}")
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for (key,) in rows:
+                        keys.add(key)
+            finally:
+                cursor.close()
+            with self._lock:
+                self._sets[table] = keys
+        self.loaded = True
+
+    def add(self, table, key):
+        with self._lock:
+            self._sets[table].add(key)
+
+    def remove(self, table, key):
+        with self._lock:
+            self._sets[table].discard(key)
+
+    def missing(self, references):
+        """Return the (table, key) pairs not present in the index."""
+        if not self.loaded:
+            return []
+        with self._lock:
+            return [(table, key) for table, key in references if key not in self._sets[table]]
+
+    def archived(self, table, key):
+        """Return True if the key is already in <table>Archive."""
+        if not self.loaded:
+            return False
+        with self._lock:
+            return key in self._sets[f"{table}Archive"]
+
+    def confirm_missing(self, connection, references):
+        """Re-check index misses in MySQL, learn the ones that exist and return the rest."""
+        still_missing = []
+        cursor = connection.cursor()
+        try:
+            for table, key in references:
+                cursor.execute(f"SELECT 1 FROM {table} WHERE {REFERENCED_TABLES[table]} = %s", (key,))
+                if cursor.fetchall():
+                    self.confirmed += 1
+                    self.add(table, key)
+                else:
+                    still_missing.append((table, key))
+        finally:
+            cursor.close()
+        self.rejected += bool(still_missing)
+        return still_missing
+
+    def stats(self):
+        with self._lock:
+            tables = {
+                table: {"Keys": len(keys), "Bytes": keys.nbytes() if isinstance(keys, IdBitmap) else None}
+                for table, keys in self._sets.items()
+            }
+        return {"Loaded": self.loaded, "Rejected": self.rejected, "ConfirmedFromDatabase": self.confirmed,
+                "Tables": tables}
+
+
+reference_index = ReferenceIndex()
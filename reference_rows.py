@@ -0,0 +1,44 @@
+"""In-memory copies of the small reference tables behind the list routes.
+
+ApplicationStatus, Unit and Exam are a few hundred rows at most and are
+read far more often than they are written, so `/api/status/all`,
+`/api/unit/show_all` and `/api/exam/all` answer from these copies.  A
+table is loaded at warm-up and reloaded whole after every write to it,
+local or from another worker; loads of one table are serialised so a
+slower, older load never replaces a newer one.
+"""
+import threading
+
+REFERENCE_TABLES = {
+    "ApplicationStatus": ("StatusID", "StatusDescription"),
+    "Unit": ("UnitID", "UnitName", "MaxCapacity"),
+    "Exam": ("ExamID", "UnitID", "ExamName", "MaxMarks"),
+}
+
+
+class ReferenceRows:
+    def __init__(self):
+        self._load_locks = {table: threading.Lock() for table in REFERENCE_TABLES}
+        self._rows = {}
+
+    def load(self, connection, tables=None):
+        for table in tables or REFERENCE_TABLES:
+            columns = REFERENCE_TABLES[table]
+            with self._load_locks[table]:
+                cursor = connection.cursor()
+                try:
+                    cursor.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY {columns[0]}")
+                    rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+                finally:
+                    cursor.close()
+                self._rows[table] = rows
+
+    def rows(self, table):
+        """Return the table's rows as dicts, or None before it is loaded."""
+        return self._rows.get(table)
+
+    def stats(self):
+        return {table: len(rows) for table, rows in self._rows.items()}
+
+
+reference_rows = ReferenceRows()
@@ -0,0 +1,101 @@
+"""Single-flight response cache for heavy report endpoints.
+
+Each entry is fresh for `ttl` seconds and may then be served stale for
+up to `stale_ttl` more seconds while one background computation
+refreshes it.  Concurrent misses for the same key wait on a single
+computation instead of each running the query.  Writes invalidate
+entries by table: invalidated entries become stale at once, so the next
+request triggers a refresh.
+"""
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CacheEntry:
+    def __init__(self, value, fresh_until, stale_until, tables):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+        self.tables = tables
+
+
+class ResponseCache:
+    def __init__(self):
+        self._entries = {}
+        self._inflight = {}
+        # Per-table write counters, so a write elsewhere does not spoil an in-flight report
+        self._generations = {}
+        self._generations_lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.computations = 0
+
+    async def get(self, key, compute, tables, ttl=30, stale_ttl=300):
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None and now < entry.fresh_until:
+            self.hits += 1
+            return entry.value
+        if entry is not None and now < entry.stale_until:
+            self.stale_hits += 1
+            self._refresh(key, compute, tables, ttl, stale_ttl)
+            return entry.value
+
+        self.misses += 1
+        return await asyncio.shield(self._refresh(key, compute, tables, ttl, stale_ttl))
+
+    def invalidate(self, table):
+        # Also called from threadpool write routes: iterate over a snapshot
+        with self._generations_lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+        for entry in list(self._entries.values()):
+            if table in entry.tables:
+                entry.fresh_until = 0
+
+    def _table_generations(self, tables):
+        with self._generations_lock:
+            return [self._generations.get(table, 0) for table in tables]
+
+    def stats(self):
+        return {
+            "Entries": len(self._entries),
+            "Hits": self.hits,
+            "StaleHits": self.stale_hits,
+            "Misses": self.misses,
+            "Computations": self.computations,
+            "InFlight": len(self._inflight),
+        }
+
+    def _refresh(self, key, compute, tables, ttl, stale_ttl):
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(
+                self._compute(key, compute, tables, ttl, stale_ttl))
+            task.add_done_callback(_log_failure)
+        return task
+
+    async def _compute(self, key, compute, tables, ttl, stale_ttl):
+        generation = self._table_generations(tables)
+        self.computations += 1
+        try:
+            value = await asyncio.get_running_loop().run_in_executor(None, compute)
+        finally:
+            self._inflight.pop(key, None)
+        now = time.time()
+        # A write that landed mid-computation leaves the value usable but stale
+        fresh_until = now + ttl if generation == self._table_generations(tables) else 0
+        self._entries[key] = CacheEntry(value, fresh_until, now + ttl + stale_ttl, set(tables))
+        return value
+
+
+def _log_failure(task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("Report cache refresh failed: %s", task.exception())
+
+
+report_cache = ResponseCache()
@@ -0,0 +1,150 @@
+"""Streaming CSV import for exam results.
+
+The upload is read row by row through csv.DictReader and written in
+chunks of CHUNK_ROWS with one multi-row upsert and one commit per chunk,
+so memory stays flat regardless of file size.  ExamID (with its
+MaxMarks) and StudentID references, and the archived ResultIDs a row
+may not reuse, are loaded once per import and checked in memory.  `import_results` is a generator of progress, error
+and summary events; `on_commit(imported)` is called right after each
+chunk commits, from the thread driving the generator, so the caller can
+invalidate caches even if the stream is abandoned part-way.
+"""
+import csv
+import io
+
+CHUNK_ROWS = 1000
+MAX_REPORTED_ERRORS = 1000
+REQUIRED_COLUMNS = ("ResultID", "StudentID", "ExamID", "Marks")
+
+ROW_PLACEHOLDER = "(%s, %s, %s, %s)"
+UPSERT_SUFFIX = """
+    ON DUPLICATE KEY UPDATE StudentID = VALUES(StudentID), ExamID = VALUES(ExamID), Marks = VALUES(Marks)
+"""
+
+
+def upsert_query(row_count):
+    return ("INSERT INTO Result (ResultID, StudentID, ExamID, Marks) VALUES "
+            + ", ".join([ROW_PLACEHOLDER] * row_count) + UPSERT_SUFFIX)
+
+
+def load_exam_max_marks(connection):
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT ExamID, MaxMarks FROM Exam")
+        return dict(cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+def load_ids(connection, query, batch_size=50000):
+    ids = set()
+    cursor = connection.cursor()
+    try:
+        cursor.execute(query)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            ids.update(row[0] for row in rows)
+    finally:
+        cursor.close()
+    return ids
+
+
+def load_student_ids(connection):
+    return load_ids(connection, "SELECT StudentID FROM Student")
+
+
+def load_archived_result_ids(connection):
+    return load_ids(connection, "SELECT ResultID FROM ResultArchive")
+
+
+def parse_row(row, exam_max_marks, student_ids, archived_ids):
+    try:
+        values = tuple(int(row[column]) for column in REQUIRED_COLUMNS)
+    except (TypeError, ValueError):
+        raise ValueError("ResultID, StudentID, ExamID and Marks must be integers")
+    result_id, student_id, exam_id, marks = values
+    if result_id in archived_ids:
+        raise ValueError(f"Result with ID {result_id} is archived")
+    if exam_id not in exam_max_marks:
+        raise ValueError(f"Exam with ID {exam_id} not found")
+    if student_id not in student_ids:
+        raise ValueError(f"Student with ID {student_id} not found")
+    max_marks = exam_max_marks[exam_id]
+    if marks < 0 or (max_marks is not None and marks > max_marks):
+        raise ValueError(f"Marks must be between 0 and {max_marks}")
+    return values
+
+
+def write_chunk(connection, chunk):
+    """Upsert (line, values) pairs and return [(line, error)] for rows that failed."""
+    cursor = connection.cursor()
+    try:
+        try:
+            cursor.execute(upsert_query(len(chunk)), [value for _, values in chunk for value in values])
+            connection.commit()
+            return []
+        except Exception:
+            connection.rollback()
+
+        failures = []
+        for line, values in chunk:
+            try:
+                cursor.execute(upsert_query(1), values)
+            except Exception as e:
+                failures.append((line, str(e)))
+        connection.commit()
+        return failures
+    finally:
+        cursor.close()
+
+
+def import_results(binary_file, connection, on_commit=None):
+    text = io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
+    reader = csv.DictReader(text)
+    missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        yield {"event": "error", "line": 1, "error": f"Missing columns: {', '.join(missing)}"}
+        yield {"event": "done", "rows": 0, "imported": 0, "failed": 0}
+        return
+
+    exam_max_marks = load_exam_max_marks(connection)
+    student_ids = load_student_ids(connection)
+    archived_ids = load_archived_result_ids(connection)
+
+    rows = imported = failed = 0
+    chunk = []
+
+    def error_event(line, error):
+        if failed <= MAX_REPORTED_ERRORS:
+            yield {"event": "error", "line": line, "error": error}
+
+    def flush():
+        nonlocal chunk, imported, failed
+        failures = write_chunk(connection, chunk)
+        written = len(chunk) - len(failures)
+        imported += written
+        chunk = []
+        if on_commit and written:
+            on_commit(written)
+        for line, error in failures:
+            failed += 1
+            yield from error_event(line, error)
+
+    for line, row in enumerate(reader, start=2):
+        rows += 1
+        try:
+            chunk.append((line, parse_row(row, exam_max_marks, student_ids, archived_ids)))
+        except ValueError as e:
+            failed += 1
+            yield from error_event(line, str(e))
+
+        if len(chunk) >= CHUNK_ROWS:
+            yield from flush()
+            yield {"event": "progress", "rows": rows, "imported": imported, "failed": failed}
+
+    if chunk:
+        yield from flush()
+
+    yield {"event": "done", "rows": rows, "imported": imported, "failed": failed}
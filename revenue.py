@@ -0,0 +1,157 @@
+"""In-memory payment revenue rollups per day, per month and per unit.
+
+The payment and application write routes feed signed deltas into
+`revenue`, so the summary endpoints only read precomputed buckets.
+`rebuild` recomputes everything from the Payment table in one pass;
+deltas applied while it runs are journaled and replayed onto the new
+buckets, so a rebuild never loses a concurrent write.  The SELECT runs
+in a consistent snapshot with `changes.read_horizon`, and deltas for
+changes that snapshot already saw are neither replayed nor applied
+later, so none is counted twice.  A periodic
+reconciliation rebuilds from MySQL to repair any drift.
+"""
+import asyncio
+import logging
+import threading
+from decimal import Decimal
+
+import changes
+import database
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_INTERVAL_SECONDS = 300
+
+REBUILD_QUERY = """
+    SELECT p.PaymentDate, a.UnitID, p.Amount
+    FROM Payment p LEFT JOIN Application a ON p.ApplicationID = a.ApplicationID
+"""
+
+
+def to_amount(value):
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def day_key(payment_date):
+    # Expects a date/datetime (or its ISO string); "2025-1-5" would split the buckets
+    return str(payment_date)[:10]
+
+
+class RevenueRollup:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._buckets = {"day": {}, "month": {}, "unit": {}}
+        self._journal = None
+        # Changes the last rebuild already summed
+        self._horizon = None
+
+    def apply(self, payment_date, unit_id, amount, count=1, change_id=None):
+        day = day_key(payment_date)
+        with self._lock:
+            if self._counted(change_id):
+                return
+            if self._journal is not None:
+                self._journal.append((self.apply, (payment_date, unit_id, amount, count, change_id)))
+            self._add("day", day, amount, count)
+            self._add("month", day[:7], amount, count)
+            self._add("unit", unit_id, amount, count)
+
+    def move_unit(self, old_unit_id, new_unit_id, amount, count, change_id=None):
+        if old_unit_id == new_unit_id or count == 0:
+            return
+        with self._lock:
+            if self._counted(change_id):
+                return
+            if self._journal is not None:
+                self._journal.append((self.move_unit, (old_unit_id, new_unit_id, amount, count, change_id)))
+            self._add("unit", old_unit_id, -amount, -count)
+            self._add("unit", new_unit_id, amount, count)
+
+    def summary(self, kind, start=None, end=None):
+        with self._lock:
+            buckets = list(self._buckets[kind].items())
+        result = []
+        for key, (total, count) in buckets:
+            if start is not None and (key is None or key < start):
+                continue
+            if end is not None and (key is None or key > end):
+                continue
+            result.append({"Key": key, "Revenue": float(total), "Payments": count})
+        result.sort(key=lambda bucket: (bucket["Key"] is None, bucket["Key"] or ""))
+        return result
+
+    def rebuild(self, connection, batch_size=10000):
+        with self._rebuild_lock:
+            self._rebuild(connection, batch_size)
+
+    def _rebuild(self, connection, batch_size):
+        buckets = {"day": {}, "month": {}, "unit": {}}
+        with self._lock:
+            self._journal = []
+        cursor = connection.cursor()
+        try:
+            connection.start_transaction(consistent_snapshot=True, readonly=True)
+            horizon = changes.read_horizon(cursor)
+            cursor.execute(REBUILD_QUERY)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for payment_date, unit_id, amount in rows:
+                    day = day_key(payment_date)
+                    amount = to_amount(amount)
+                    _add_to(buckets["day"], day, amount, 1)
+                    _add_to(buckets["month"], day[:7], amount, 1)
+                    _add_to(buckets["unit"], unit_id, amount, 1)
+            connection.commit()
+        except Exception:
+            with self._lock:
+                self._journal = None
+            raise
+        finally:
+            cursor.close()
+        with self._lock:
+            journal, self._journal = self._journal, None
+            self._buckets = buckets
+            self._horizon = horizon
+        # Writes that landed while the SELECT ran, less those it saw; outside the lock, apply() takes it
+        for method, args in journal:
+            method(*args)
+
+    def _counted(self, change_id):
+        return self._horizon is not None and self._horizon.contains(change_id)
+
+    def _add(self, kind, key, amount, count):
+        _add_to(self._buckets[kind], key, amount, count)
+
+
+def _add_to(buckets, key, amount, count):
+    total, payments = buckets.get(key, (Decimal(0), 0))
+    total += amount
+    payments += count
+    if payments <= 0:
+        buckets.pop(key, None)
+    else:
+        buckets[key] = (total, payments)
+
+
+revenue = RevenueRollup()
+
+
+def reconcile():
+    connection = database.get_connection()
+    try:
+        revenue.rebuild(connection)
+    finally:
+        connection.close()
+
+
+async def reconcile_forever():
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(RECONCILE_INTERVAL_SECONDS)
+        try:
+            await loop.run_in_executor(None, reconcile)
+        except Exception:
+            logger.exception("Revenue rollup reconciliation failed")
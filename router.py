@@ -1,8 +1,326 @@
-from fastapi import FastAPI, HTTPException, Depends
+import asyncio
+import json
+import logging
+import shutil
+import tempfile
+from datetime import date
+from itertools import groupby
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, File, Request, UploadFile
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, conint, constr
+import admission
+import archive
+import changes
+import checkin
+import invalidation
+import loader
+import payment_reconciliation
+import query_guard
+import snapshot
+from changes import change_log
+from query_guard import fetchall_with_deadline, guarded_fetchall
 import database
+import write_batcher
+from admit_card_view import admit_card_view
+from dashboard import unit_counters, reconcile
+from search_index import student_index, load_students, reload_student
+from rankings import ranking_cache
+from reference_index import REFERENCED_TABLES, reference_index
+from reference_rows import REFERENCE_TABLES, reference_rows
+from response_cache import report_cache
+from result_import import import_results
+from revenue import revenue, to_amount
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+SSE_HEARTBEAT_SECONDS = 15
+# Rollups rebuilt from MySQL at most this often after another worker archives rows
+INVALIDATION_REFRESH_SECONDS = 2
+# Writes to these tables invalidate the cached unit cutoffs and rank lists
+RANKING_TABLES = ("Result", "Application", "Exam", "Unit")
+# Tables copied into admit cards (besides AdmitCard itself) -> the card column holding their key
+ADMIT_CARD_SOURCES = {"Student": "StudentID", "Application": "ApplicationID", "ExamSchedule": "ExamScheduleID",
+                      "Exam": "ExamID"}
+# Strong references to fire-and-forget jobs so they are not garbage collected
+background_tasks = set()
+
+
+@router.get("/api/db/query_stats")
+async def get_query_stats():
+    return query_guard.stats()
+
+
+@router.get("/api/db/loader_stats")
+async def get_loader_stats():
+    return loader.stats()
+
+
+@router.get("/api/db/replicas")
+async def get_replica_stats():
+    return {"strategy": database.REPLICA_STRATEGY, "replicas": database.replica_stats()}
+
+
+@router.get("/api/db/pool")
+async def get_pool_stats():
+    return database.pool_stats()
+
+
+def apply_deltas(deltas, change_id=None):
+    # Counter and revenue deltas travel with the change, so every worker applies the same ones;
+    # change_id lets a rebuild drop those its snapshot already counted
+    for kind, *args in deltas or ():
+        if kind == "count":
+            unit_counters.apply(*args, change_id=change_id)
+        elif kind == "capacity":
+            unit_counters.set_capacity(*args, change_id=change_id)
+        elif kind == "remove_unit":
+            unit_counters.remove_unit(*args, change_id=change_id)
+        elif kind == "revenue":
+            payment_date, unit_id, amount, count = args
+            revenue.apply(payment_date, unit_id, to_amount(amount), count, change_id)
+        elif kind == "move_revenue":
+            old_unit_id, new_unit_id, amount, count = args
+            revenue.move_unit(old_unit_id, new_unit_id, to_amount(amount), count, change_id)
+
+
+def revenue_delta(payment_date, unit_id, amount, count=1):
+    return ["revenue", str(payment_date), unit_id, str(to_amount(amount)), count]
+
+
+def stage_change(cursor, table, op, key, data=None, deltas=None):
+    # The feed row goes in through the route's cursor, so it commits with the write itself
+    return changes.stage(cursor, table, op, key, data, deltas)
+
+
+def publish_change(message):
+    # After the commit: apply the deltas here, add the entry to the local feed and tell the other workers
+    apply_deltas(message.get("deltas"), message.get("cursor"))
+    if message.get("cursor") is not None:
+        change_log.add(changes.to_entry(message["cursor"], message, message["at"]))
+    invalidation.publish(message)
+    if message["table"] in RANKING_TABLES:
+        ranking_cache.invalidate()
+    report_cache.invalidate(message["table"])
+
+
+def record_change(table, op, key, data=None, deltas=None):
+    # For writes without a transaction to join (imports, archive jobs): its own INSERT and commit,
+    # so call it off the event loop
+    try:
+        message = changes.record(table, op, key, data, deltas)
+    except Exception:
+        # The write itself is committed; other workers still hear of it over the bus
+        logger.exception("Could not append %s %s %s to the change feed", table, op, key)
+        message = {"table": table, "op": op, "key": key,
+                   "data": jsonable_encoder(data) if data is not None else None, "deltas": deltas}
+    publish_change(message)
+
+
+def refresh_student(student_id):
+    connection = database.get_connection()
+    try:
+        if student_id is None:
+            load_students(connection)
+        else:
+            reload_student(connection, student_id)
+    finally:
+        connection.close()
+
+
+def refresh_admit_cards(table=None, key=None, op=None):
+    connection = database.get_connection()
+    try:
+        if table == "AdmitCard" and op == "delete":
+            admit_card_view.remove_card(key)
+        elif table == "AdmitCard" and key is not None:
+            admit_card_view.refresh_card(connection, key)
+        elif table == "Student" and key is not None:
+            admit_card_view.refresh_student(connection, key)
+        elif table in ADMIT_CARD_SOURCES and key is not None:
+            admit_card_view.refresh_by(connection, ADMIT_CARD_SOURCES[table], key)
+        else:
+            admit_card_view.build(connection)
+    finally:
+        connection.close()
+
+
+def refresh_revenue():
+    connection = database.get_connection()
+    try:
+        revenue.rebuild(connection)
+    finally:
+        connection.close()
+
+
+def refresh_rollups():
+    refresh_revenue()
+    reconcile()
+
+
+def refresh_references(tables=None):
+    connection = database.get_connection()
+    try:
+        if tables is None:
+            # The archive tables are indexed too, so they must exist before the first archive job
+            cursor = connection.cursor()
+            try:
+                archive.ensure_archive_tables(cursor)
+                connection.commit()
+            finally:
+                cursor.close()
+        reference_index.load(connection, tables)
+    finally:
+        connection.close()
+
+
+def refresh_reference_rows(tables=None):
+    connection = database.get_connection()
+    try:
+        reference_rows.load(connection, tables)
+    finally:
+        connection.close()
 
-app = FastAPI()
+
+def apply_remote_reference(message):
+    table = message["table"]
+    if message["op"] == "archive":
+        tables = [name for name in (table, f"{table}Archive") if name in REFERENCED_TABLES]
+        asyncio.get_running_loop().run_in_executor(None, refresh_references, tables)
+    elif table not in REFERENCED_TABLES:
+        return
+    elif message["op"] == "insert":
+        reference_index.add(table, message["key"])
+    elif message["op"] == "delete":
+        reference_index.remove(table, message["key"])
+
+
+def confirm_missing_references(references):
+    connection = database.get_connection()
+    try:
+        return reference_index.confirm_missing(connection, references)
+    finally:
+        connection.close()
+
+
+def check_references(*references):
+    # Checked before the route's try block so the 400 is not turned into a 500
+    missing = reference_index.missing(references)
+    if missing:
+        missing = confirm_missing_references(missing)
+    if missing:
+        table, key = missing[0]
+        raise HTTPException(status_code=400, detail=f"{table} with ID {key} does not exist")
+
+
+def check_not_archived(table, key):
+    # Archived IDs are never freed; a live row reusing one could not be archived itself
+    if reference_index.archived(table, key):
+        raise HTTPException(status_code=409, detail=f"{table} with ID {key} is archived and cannot be reused")
+
+
+async def require_references(*references):
+    # Index hits are answered on the loop; only a miss goes to MySQL, in a thread
+    if reference_index.missing(references):
+        await asyncio.to_thread(check_references, *references)
+
+
+@router.get("/api/db/reference_index")
+async def get_reference_index_stats():
+    return {**reference_index.stats(), "ReferenceRows": reference_rows.stats()}
+
+
+def refresh_remote_admit_cards(message):
+    # Inserts into the source tables cannot touch an existing card, nor can a bulk status change
+    if message["table"] != "AdmitCard" and message["op"] not in ("update", "delete", "archive"):
+        return
+    asyncio.get_running_loop().run_in_executor(
+        None, refresh_admit_cards, message["table"], message["key"], message["op"])
+
+
+def accept_remote_change(message):
+    # Each change is dispatched once, whether it comes over the bus or from the feed repair
+    if message.get("truncated"):
+        return False
+    if message.get("cursor") is None:
+        return True
+    return change_log.add(changes.to_entry(message["cursor"], message, message["at"]))
+
+
+#  Cross-worker invalidation: caches fed by another worker's writes
+async def start_invalidation_bus():
+    loop = asyncio.get_running_loop()
+    # Archive moves rows without per-row deltas, so only that rebuilds from MySQL
+    rebuild_rollups = invalidation.Debounced(refresh_rollups, INVALIDATION_REFRESH_SECONDS)
+
+    def rebuild_after_archive(message):
+        if message["op"] == "archive":
+            rebuild_rollups()
+
+    invalidation.set_gate(accept_remote_change)
+    invalidation.subscribe("Student", lambda message: loop.run_in_executor(
+        None, refresh_student, message["key"]))
+    invalidation.subscribe("*", lambda message: apply_deltas(message.get("deltas"), message.get("cursor")))
+    for table in ("Application", "Payment"):
+        invalidation.subscribe(table, rebuild_after_archive)
+    for table in {*REFERENCED_TABLES, *archive.ARCHIVE_TABLES}:
+        invalidation.subscribe(table, apply_remote_reference)
+    for table in REFERENCE_TABLES:
+        invalidation.subscribe(table, lambda message: loop.run_in_executor(
+            None, refresh_reference_rows, [message["table"]]))
+    for table in RANKING_TABLES:
+        invalidation.subscribe(table, ranking_cache.invalidate)
+    for table in ("AdmitCard", *ADMIT_CARD_SOURCES):
+        invalidation.subscribe(table, refresh_remote_admit_cards)
+    invalidation.subscribe("*", lambda message: report_cache.invalidate(message["table"]))
+    invalidation.start()
+
+
+@router.get("/api/invalidation/stats")
+async def get_invalidation_stats():
+    return {**invalidation.stats(), "ChangeFeed": change_log.stats()}
+
+
+#  Change Feed: long-poll (JSON) and Server-Sent Events
+@router.get("/api/changes")
+async def get_changes(since: int = None, limit: conint(ge=1, le=1000) = 500,
+                      wait: conint(ge=0, le=60) = 25):
+    cursor = change_log.latest if since is None else since
+    entries, reset = await change_log.wait(cursor, limit, wait)
+    next_cursor = change_log.latest if reset else (entries[-1]["Cursor"] if entries else cursor)
+    return {"changes": entries, "next": next_cursor, "reset": reset}
+
+
+@router.get("/api/changes/stream")
+async def stream_changes(request: Request, since: int = None):
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    cursor = change_log.latest if since is None else since
+
+    async def events():
+        nonlocal cursor
+        while not await request.is_disconnected():
+            entries, reset = await change_log.wait(cursor, 500, SSE_HEARTBEAT_SECONDS)
+            if reset:
+                cursor = change_log.latest
+                yield f"id: {cursor}\nevent: reset\ndata: {{}}\n\n"
+            elif entries:
+                for entry in entries:
+                    yield f"id: {entry['Cursor']}\nevent: change\ndata: {json.dumps(entry)}\n\n"
+                cursor = entries[-1]["Cursor"]
+            else:
+                yield ": heartbeat\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.get("/api/admission/stats")
+async def get_admission_stats():
+    return admission.stats()
 
 
 class Student(BaseModel):
@@ -17,27 +335,130 @@ class ContactUpdate(BaseModel):
     ContactNumber: constr(min_length=10, max_length=15)
 
 
-@app.get("/api/students")
-async def get_students():
+#  Fetch Students, one object per student, paged by StudentID (GET)
+@router.get("/api/students")
+async def get_students(request: Request, after: int = -1, limit: conint(ge=1, le=1000) = 100):
     query = """
         SELECT s.StudentID, s.Name, s.Age, s.Address, c.ContactNumber
-        FROM Student s LEFT JOIN ContactNumber c ON s.StudentID = c.StudentID
+        FROM (
+            SELECT StudentID, Name, Age, Address FROM Student
+            WHERE StudentID > %s ORDER BY StudentID LIMIT %s
+        ) s LEFT JOIN ContactNumber c ON s.StudentID = c.StudentID
+        ORDER BY s.StudentID
     """
-    return fetch_data(query, ["StudentID", "Name", "Age", "Address", "ContactNumber"])
+    try:
+        students = group_students(await guarded_fetchall(request, query, (after, limit), route_class="read"))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    next_after = students[-1]["StudentID"] if len(students) == limit else None
+    return {"students": students, "next_after": next_after}
+
+#  Fuzzy Search Students by Name / Address (GET)
+@router.get("/api/students/search")
+async def search_students(q: constr(min_length=1, max_length=255), limit: conint(ge=1, le=100) = 20):
+    # Off the event loop: even a bounded scan should not stall other requests
+    return {"query": q, "results": await asyncio.to_thread(student_index.search, q, limit=limit)}
 
 # Fetch Single Student (GET)
-@app.get("/api/students/{student_id}")
+@router.get("/api/students/{student_id}")
 async def get_student(student_id: int):
-    query = """
+    # Batched with concurrent lookups into one WHERE StudentID IN (...) query
+    try:
+        students = group_students(await loader.load("Student", student_id))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not students:
+        raise HTTPException(status_code=404, detail="Data not found")
+    return students[0]
+
+#  Student Profile: student, contacts, applications, payments, admit cards, results (GET)
+@router.get("/api/students/{student_id}/profile")
+def get_student_profile(student_id: int):
+    student_query = """
         SELECT s.StudentID, s.Name, s.Age, s.Address, c.ContactNumber
         FROM Student s LEFT JOIN ContactNumber c ON s.StudentID = c.StudentID
-        WHERE s.StudentID=%s
+        WHERE s.StudentID = %s
+    """
+    application_query = """
+        SELECT a.ApplicationID, a.UnitID, a.StatusID, st.StatusDescription
+        FROM Application a LEFT JOIN ApplicationStatus st ON a.StatusID = st.StatusID
+        WHERE a.StudentID = %s
     """
-    return fetch_single_data(query, [student_id], ["StudentID", "Name", "Age", "Address", "ContactNumber"])
+    payment_query = """
+        SELECT p.PaymentID, p.ApplicationID, p.Amount, p.PaymentDate
+        FROM Payment p JOIN Application a ON p.ApplicationID = a.ApplicationID
+        WHERE a.StudentID = %s
+    """
+    admit_card_query = """
+        SELECT ac.AdmitCardID, ac.ApplicationID, ac.ExamScheduleID, ac.AdmitDate,
+               es.ExamID, es.ExamDate, es.ExamTime, es.VenueID
+        FROM AdmitCard ac
+        JOIN Application a ON ac.ApplicationID = a.ApplicationID
+        LEFT JOIN ExamSchedule es ON ac.ExamScheduleID = es.ExamScheduleID
+        WHERE a.StudentID = %s
+    """
+    result_query = "SELECT ResultID, ExamID, Marks FROM Result WHERE StudentID = %s"
+    connection = None
+    cursor = None
+    try:
+        connection = database.get_read_connection()
+        cursor = connection.cursor()
+
+        cursor.execute(student_query, (student_id,))
+        students = group_students(cursor.fetchall())
+        if not students:
+            raise HTTPException(status_code=404, detail=f"Student with ID {student_id} not found")
+        profile = students[0]
+
+        cursor.execute(application_query, (student_id,))
+        profile["Applications"] = [
+            {"ApplicationID": row[0], "UnitID": row[1], "StatusID": row[2], "StatusDescription": row[3]}
+            for row in cursor.fetchall()
+        ]
+
+        cursor.execute(payment_query, (student_id,))
+        profile["Payments"] = [
+            {"PaymentID": row[0], "ApplicationID": row[1], "Amount": float(row[2]), "PaymentDate": str(row[3])}
+            for row in cursor.fetchall()
+        ]
+
+        cursor.execute(admit_card_query, (student_id,))
+        profile["AdmitCards"] = [
+            {
+                "AdmitCardID": row[0],
+                "ApplicationID": row[1],
+                "ExamScheduleID": row[2],
+                "AdmitDate": str(row[3]),
+                "ExamID": row[4],
+                "ExamDate": str(row[5]) if row[5] is not None else None,
+                "ExamTime": str(row[6]) if row[6] is not None else None,
+                "VenueID": row[7]
+            }
+            for row in cursor.fetchall()
+        ]
+
+        cursor.execute(result_query, (student_id,))
+        profile["Results"] = [
+            {"ResultID": row[0], "ExamID": row[1], "Marks": row[2]} for row in cursor.fetchall()
+        ]
+        return profile
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
 
 #  Insert Student & Contact Number (POST)
-@app.post("/api/students")
-async def add_student(student: Student):
+@router.post("/api/students")
+def add_student(student: Student):
+    connection = None
+    cursor = None
     try:
         connection = database.get_connection()
         cursor = connection.cursor()
@@ -45,51 +466,109 @@ async def add_student(student: Student):
                        (student.StudentID, student.Name, student.Age, student.Address))
         cursor.execute("INSERT INTO ContactNumber (StudentID, ContactNumber) VALUES (%s, %s)",
                        (student.StudentID, student.ContactNumber))
+        change = stage_change(cursor, "Student", "insert", student.StudentID, student)
         connection.commit()
+
+        student_index.add(student.StudentID, student.Name, student.Address)
+        reference_index.add("Student", student.StudentID)
+        publish_change(change)
         return {"message": "Student registered successfully", "StudentID": student.StudentID}
     except Exception as e:
+        if connection:
+            # Drop a half-done Student insert before the connection goes back to the pool
+            connection.rollback()
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
 
 
 #  Update Student (PUT)
-@app.put("/api/students/{student_id}")
-async def update_student(student_id: int, student: Student):
-    return update_data("UPDATE Student SET Name=%s, Age=%s, Address=%s WHERE StudentID=%s",
-                       (student.Name, student.Age, student.Address, student_id))
+@router.put("/api/students/{student_id}")
+def update_student(student_id: int, student: Student):
+    response = update_data("UPDATE Student SET Name=%s, Age=%s, Address=%s WHERE StudentID=%s",
+                           (student.Name, student.Age, student.Address, student_id),
+                           ("Student", "update", student_id, student))
+    student_index.add(student_id, student.Name, student.Address)
+    refresh_admit_cards("Student", student_id, "update")
+    return response
 
 #  Update Contact Number (PUT)
-@app.put("/api/contact/{student_id}")
-async def update_contact(student_id: int, contact: ContactUpdate):
-    return update_data("UPDATE ContactNumber SET ContactNumber=%s WHERE StudentID=%s",
-                       (contact.ContactNumber, student_id))
+@router.put("/api/contact/{student_id}")
+def update_contact(student_id: int, contact: ContactUpdate):
+    response = update_data("UPDATE ContactNumber SET ContactNumber=%s WHERE StudentID=%s",
+                           (contact.ContactNumber, student_id), ("ContactNumber", "update", student_id, contact))
+    return response
 
 #  Delete Student & Contact (DELETE)
-@app.delete("/api/students/{student_id}")
-async def delete_student(student_id: int):
-    return delete_data("DELETE FROM Student WHERE StudentID=%s", [student_id])
+@router.delete("/api/students/{student_id}")
+def delete_student(student_id: int):
+    response = delete_data("DELETE FROM Student WHERE StudentID=%s", [student_id], ("Student", "delete", student_id))
+    student_index.remove(student_id)
+    reference_index.remove("Student", student_id)
+    refresh_admit_cards("Student", student_id, "delete")
+    return response
 
 #  Delete Contact Only (DELETE)
-@app.delete("/api/contact/{student_id}")
-async def delete_contact(student_id: int):
-    return delete_data("DELETE FROM ContactNumber WHERE StudentID=%s", [student_id])
+@router.delete("/api/contact/{student_id}")
+def delete_contact(student_id: int):
+    response = delete_data("DELETE FROM ContactNumber WHERE StudentID=%s", [student_id],
+                           ("ContactNumber", "delete", student_id))
+    return response
 
 # -------------------------------------------
 #  Helper Functions (Database Operations)
 # -------------------------------------------
 def fetch_data(query, columns):
+    connection = None
+    cursor = None
     try:
-        connection = database.get_connection()
+        connection = database.get_read_connection()
         cursor = connection.cursor()
         cursor.execute(query)
         results = cursor.fetchall()
         return [dict(zip(columns, row)) for row in results]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+
+def group_students(rows):
+    # rows: (StudentID, Name, Age, Address, ContactNumber) ordered by StudentID
+    students = []
+    for student_id, student_rows in groupby(rows, key=lambda row: row[0]):
+        first = next(student_rows)
+        contacts = [first[4]] if first[4] is not None else []
+        contacts.extend(row[4] for row in student_rows if row[4] is not None)
+        students.append({
+            "StudentID": student_id,
+            "Name": first[1],
+            "Age": first[2],
+            "Address": first[3],
+            "ContactNumbers": contacts
+        })
+    return students
+
+
+async def load_or_404(table, key):
+    try:
+        rows = await loader.load(table, key)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not rows:
+        raise HTTPException(status_code=404, detail=f"{table} with ID {key} not found")
+    return rows
 
 
 def fetch_single_data(query, values, columns):
     try:
-        connection = database.get_connection()
+        connection = database.get_read_connection()
         cursor = connection.cursor()
         cursor.execute(query, values)
         result = cursor.fetchone()
@@ -103,14 +582,17 @@ def fetch_single_data(query, values, columns):
         cursor.close()
         connection.close()
 
-def update_data(query, values):
+def update_data(query, values, change):
+    # change: (table, op, key[, data]) for the feed row committed with the update
     try:
         connection = database.get_connection()
         cursor = connection.cursor()
         cursor.execute(query, values)
-        connection.commit()
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Data not found")
+        message = stage_change(cursor, *change)
+        connection.commit()
+        publish_change(message)
         return {"message": "Data updated successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -118,14 +600,17 @@ def update_data(query, values):
         cursor.close()
         connection.close()
 
-def delete_data(query, values):
+def delete_data(query, values, change):
+    # change: (table, op, key) for the feed row committed with the delete
     try:
         connection = database.get_connection()
         cursor = connection.cursor()
         cursor.execute(query, values)
-        connection.commit()
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Data not found")
+        message = stage_change(cursor, *change)
+        connection.commit()
+        publish_change(message)
         return {"message": "Data deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -141,37 +626,39 @@ class ApplicationStatus(BaseModel):
 
 
 
-@app.get("/api/status/all")
-async def get_all_status():
+@router.get("/api/status/all")
+async def get_all_status(request: Request):
+    cached = reference_rows.rows("ApplicationStatus")
+    if cached is not None:
+        return {"statuses": cached}
     query = "SELECT * FROM ApplicationStatus"
     try:
-        connection = database.get_connection()
-        cursor = connection.cursor()
-        cursor.execute(query)
-        statuses = cursor.fetchall()
+        statuses = await guarded_fetchall(request, query, route_class="read")
 
         result = [
             {"StatusID": status[0], "StatusDescription": status[1]} for status in statuses
         ]
         return {"statuses": result}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
 
 
-@app.post("/api/status/add")
-async def add_status(status: ApplicationStatus):
+@router.post("/api/status/add")
+def add_status(status: ApplicationStatus):
     query = "INSERT INTO ApplicationStatus (StatusID, StatusDescription) VALUES (%s, %s)"
     try:
         connection = database.get_connection()
         cursor = connection.cursor()
         cursor.execute(query, (status.StatusID, status.StatusDescription))
+        change = stage_change(cursor, "ApplicationStatus", "insert", status.StatusID, status)
         connection.commit()
+
+        reference_index.add("ApplicationStatus", status.StatusID)
+        reference_rows.load(connection, ["ApplicationStatus"])
+        publish_change(change)
         return {"message": "Status added successfully", "StatusID": status.StatusID}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -183,18 +670,20 @@ async def add_status(status: ApplicationStatus):
 
 
 
-@app.put("/api/status/update/{status_id}")
-async def update_status(status_id: int, status: ApplicationStatus):
+@router.put("/api/status/update/{status_id}")
+def update_status(status_id: int, status: ApplicationStatus):
     query = "UPDATE ApplicationStatus SET StatusDescription = %s WHERE StatusID = %s"
     try:
         connection = database.get_connection()
         cursor = connection.cursor()
         cursor.execute(query, (status.StatusDescription, status_id))
-        connection.commit()
-
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail=f"Status with ID {status_id} not found")
+        change = stage_change(cursor, "ApplicationStatus", "update", status_id, status)
+        connection.commit()
 
+        reference_rows.load(connection, ["ApplicationStatus"])
+        publish_change(change)
         return {"message": f"Status with ID {status_id} updated successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -206,18 +695,21 @@ async def update_status(status_id: int, status: ApplicationStatus):
 
 
 
-@app.delete("/api/status/delete/{status_id}")
-async def delete_status(status_id: int):
+@router.delete("/api/status/delete/{status_id}")
+def delete_status(status_id: int):
     query = "DELETE FROM ApplicationStatus WHERE StatusID = %s"
     try:
         connection = database.get_connection()
         cursor = connection.cursor()
         cursor.execute(query, (status_id,))
-        connection.commit()
-
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail=f"Status with ID {status_id} not found")
+        change = stage_change(cursor, "ApplicationStatus", "delete", status_id)
+        connection.commit()
 
+        reference_index.remove("ApplicationStatus", status_id)
+        reference_rows.load(connection, ["ApplicationStatus"])
+        publish_change(change)
         return {"message": f"Status with ID {status_id} deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -235,14 +727,11 @@ class Application(BaseModel):
     StatusID: int
 
 
-@app.get("/api/application/all")
-async def get_all_applications():
+@router.get("/api/application/all")
+async def get_all_applications(request: Request):
     query = "SELECT * FROM Application"
     try:
-        connection = database.get_connection()
-        cursor = connection.cursor()
-        cursor.execute(query)
-        applications = cursor.fetchall()
+        applications = await guarded_fetchall(request, query, route_class="report")
 
         result = [
             {
@@ -254,41 +743,43 @@ async def get_all_applications():
             for app in applications
         ]
         return {"applications": result}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
 
 
-@app.post("/api/application/add")
+@router.get("/api/application/get/{application_id}")
+async def get_application(application_id: int):
+    rows = await load_or_404("Application", application_id)
+    return {"ApplicationID": rows[0][0], "StudentID": rows[0][1], "UnitID": rows[0][2], "StatusID": rows[0][3]}
+
+
+
+@router.post("/api/application/add")
 async def add_application(application: Application):
-    query = """
-        INSERT INTO Application (ApplicationID, StudentID, UnitID, StatusID)
-        VALUES (%s, %s, %s, %s)
-    """
+    check_not_archived("Application", application.ApplicationID)
+    await require_references(("Student", application.StudentID), ("Unit", application.UnitID),
+                             ("ApplicationStatus", application.StatusID))
     try:
-        connection = database.get_connection()
-        cursor = connection.cursor()
-        cursor.execute(query,
-                       (application.ApplicationID, application.StudentID, application.UnitID, application.StatusID))
-        connection.commit()
+        # Coalesced with concurrent inserts when batching is enabled for Application
+        change = await write_batcher.insert(
+            "Application",
+            (application.ApplicationID, application.StudentID, application.UnitID, application.StatusID),
+            ("Application", "insert", application.ApplicationID, application,
+             [["count", application.UnitID, application.StatusID, 1]])
+        )
+        reference_index.add("Application", application.ApplicationID)
+        publish_change(change)
         return {"message": "Application added successfully", "ApplicationID": application.ApplicationID}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
 
 
-@app.put("/api/application/update/{application_id}")
-async def update_application(application_id: int, application: Application):
+@router.put("/api/application/update/{application_id}")
+def update_application(application_id: int, application: Application):
     query = """
         UPDATE Application 
         SET StudentID = %s, UnitID = %s, StatusID = %s 
@@ -297,12 +788,19 @@ async def update_application(application_id: int, application: Application):
     try:
         connection = database.get_connection()
         cursor = connection.cursor()
+        old_unit_id, old_status_id, paid_total, paid_count = fetch_application_state(cursor, application_id)
         cursor.execute(query, (application.StudentID, application.UnitID, application.StatusID, application_id))
-        connection.commit()
-
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail=f"Application with ID {application_id} not found")
+        change = stage_change(cursor, "Application", "update", application_id, application, [
+            ["move_revenue", old_unit_id, application.UnitID, str(paid_total), paid_count],
+            ["count", old_unit_id, old_status_id, -1],
+            ["count", application.UnitID, application.StatusID, 1],
+        ])
+        connection.commit()
 
+        admit_card_view.refresh_by(connection, "ApplicationID", application_id)
+        publish_change(change)
         return {"message": f"Application with ID {application_id} updated successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -314,18 +812,26 @@ async def update_application(application_id: int, application: Application):
 
 
 
-@app.delete("/api/application/delete/{application_id}")
-async def delete_application(application_id: int):
+@router.delete("/api/application/delete/{application_id}")
+def delete_application(application_id: int):
     query = "DELETE FROM Application WHERE ApplicationID = %s"
     try:
         connection = database.get_connection()
         cursor = connection.cursor()
+        old_unit_id, old_status_id, paid_total, paid_count = fetch_application_state(cursor, application_id)
         cursor.execute(query, (application_id,))
-        connection.commit()
-
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail=f"Application with ID {application_id} not found")
+        # Payments are not cascaded; they stay behind without a unit.
+        change = stage_change(cursor, "Application", "delete", application_id, deltas=[
+            ["move_revenue", old_unit_id, None, str(paid_total), paid_count],
+            ["count", old_unit_id, old_status_id, -1],
+        ])
+        connection.commit()
 
+        reference_index.remove("Application", application_id)
+        admit_card_view.refresh_by(connection, "ApplicationID", application_id)
+        publish_change(change)
         return {"message": f"Application with ID {application_id} deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -336,82 +842,44 @@ async def delete_application(application_id: int):
             connection.close()
 
 
-class Application(BaseModel):
-    ApplicationID: int
-    StudentID: int
-    UnitID: str
+class BulkStatusUpdate(BaseModel):
+    ApplicationIDs: List[int]
     StatusID: int
 
 
-@app.get("/api/application/all")
-async def get_all_applications():
-    query = "SELECT * FROM Application"
-    try:
-        connection = database.get_connection()
-        cursor = connection.cursor()
-        cursor.execute(query)
-        applications = cursor.fetchall()
-
-        result = [
-            {
-                "ApplicationID": app[0],
-                "StudentID": app[1],
-                "UnitID": app[2],
-                "StatusID": app[3]
-            }
-            for app in applications
-        ]
-        return {"applications": result}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
-
-
-
-@app.post("/api/application/add")
-async def add_application(application: Application):
-    query = """
-        INSERT INTO Application (ApplicationID, StudentID, UnitID, StatusID)
-        VALUES (%s, %s, %s, %s)
+@router.put("/api/application/bulk_status")
+def bulk_update_application_status(update: BulkStatusUpdate):
+    application_ids = sorted(set(update.ApplicationIDs))
+    if not application_ids or len(application_ids) > 10000:
+        raise HTTPException(status_code=400, detail="ApplicationIDs must contain between 1 and 10000 IDs")
+    placeholders = ", ".join(["%s"] * len(application_ids))
+    count_query = f"""
+        SELECT UnitID, StatusID, COUNT(*) FROM Application
+        WHERE ApplicationID IN ({placeholders})
+        GROUP BY UnitID, StatusID
+        FOR UPDATE
     """
+    update_query = f"UPDATE Application SET StatusID = %s WHERE ApplicationID IN ({placeholders})"
+    connection = None
+    cursor = None
     try:
         connection = database.get_connection()
         cursor = connection.cursor()
-        cursor.execute(query,
-                       (application.ApplicationID, application.StudentID, application.UnitID, application.StatusID))
+        cursor.execute(count_query, application_ids)
+        before = cursor.fetchall()
+        cursor.execute(update_query, [update.StatusID] + application_ids)
+        deltas = []
+        for unit_id, status_id, count in before:
+            deltas.append(["count", unit_id, status_id, -count])
+            deltas.append(["count", unit_id, update.StatusID, count])
+        # One change (and one bus message) for the whole batch
+        change = stage_change(cursor, "Application", "bulk_update", None,
+                              {"ApplicationIDs": application_ids, "StatusID": update.StatusID}, deltas)
         connection.commit()
-        return {"message": "Application added successfully", "ApplicationID": application.ApplicationID}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
-
-
-@app.put("/api/application/update/{application_id}")
-async def update_application(application_id: int, application: Application):
-    query = """
-        UPDATE Application 
-        SET StudentID = %s, UnitID = %s, StatusID = %s 
-        WHERE ApplicationID = %s
-    """
-    try:
-        connection = database.get_connection()
-        cursor = connection.cursor()
-        cursor.execute(query, (application.StudentID, application.UnitID, application.StatusID, application_id))
-        connection.commit()
-
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail=f"Application with ID {application_id} not found")
-
-        return {"message": f"Application with ID {application_id} updated successfully"}
+        publish_change(change)
+        return {"message": "Application statuses updated successfully",
+                "Updated": sum(count for _, _, count in before)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
@@ -421,44 +889,38 @@ async def update_application(application_id: int, application: Application):
             connection.close()
 
 
-@app.delete("/api/application/delete/{application_id}")
-async def delete_application(application_id: int):
-    query = "DELETE FROM Application WHERE ApplicationID = %s"
-    try:
-        connection = database.get_connection()
-        cursor = connection.cursor()
-        cursor.execute(query, (application_id,))
-        connection.commit()
+@router.get("/api/dashboard/units")
+async def get_unit_dashboard():
+    return {
+        "units": unit_counters.units(),
+        "LastReconciled": unit_counters.last_reconciled,
+        "LastDrift": unit_counters.last_drift
+    }
 
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail=f"Application with ID {application_id} not found")
 
-        return {"message": f"Application with ID {application_id} deleted successfully"}
+@router.post("/api/dashboard/reconcile")
+def reconcile_unit_dashboard():
+    try:
+        drift = reconcile()
+        return {"message": "Unit counters reconciled successfully", "Drift": drift}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
 
 class Payment(BaseModel):
     PaymentID: int
     ApplicationID: int
     Amount: float
-    PaymentDate: str
+    # Parsed, so revenue buckets use the same YYYY-MM-DD key MySQL stores
+    PaymentDate: date
 
 
 
-@app.get("/api/payment/all")
-async def get_all_payments():
+@router.get("/api/payment/all")
+async def get_all_payments(request: Request):
     query = "SELECT * FROM Payment"
     try:
-        connection = database.get_connection()
-        cursor = connection.cursor()
-        cursor.execute(query)
-        payments = cursor.fetchall()
+        payments = await guarded_fetchall(request, query, route_class="report")
 
         result = [
             {
@@ -470,39 +932,43 @@ async def get_all_payments():
             for payment in payments
         ]
         return {"payments": result}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
 
 
-@app.post("/api/payment/add")
+@router.get("/api/payment/get/{payment_id}")
+async def get_payment(payment_id: int):
+    rows = await load_or_404("Payment", payment_id)
+    return {"PaymentID": rows[0][0], "ApplicationID": rows[0][1], "Amount": float(rows[0][2]),
+            "PaymentDate": str(rows[0][3])}
+
+
+
+@router.post("/api/payment/add")
 async def add_payment(payment: Payment):
-    query = """
-        INSERT INTO Payment (PaymentID, ApplicationID, Amount, PaymentDate)
-        VALUES (%s, %s, %s, %s)
-    """
+    check_not_archived("Payment", payment.PaymentID)
+    await require_references(("Application", payment.ApplicationID))
     try:
-        connection = database.get_connection()
-        cursor = connection.cursor()
-        cursor.execute(query, (payment.PaymentID, payment.ApplicationID, payment.Amount, payment.PaymentDate))
-        connection.commit()
+        # The unit is looked up first so the revenue delta can be committed with the row
+        unit_id = await asyncio.to_thread(lookup_unit_id, payment.ApplicationID)
+        # Coalesced with concurrent inserts when batching is enabled for Payment
+        change = await write_batcher.insert(
+            "Payment",
+            (payment.PaymentID, payment.ApplicationID, payment.Amount, payment.PaymentDate),
+            ("Payment", "insert", payment.PaymentID, payment,
+             [revenue_delta(payment.PaymentDate, unit_id, payment.Amount)])
+        )
+        publish_change(change)
         return {"message": "Payment added successfully", "PaymentID": payment.PaymentID}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
 
-@app.put("/api/payment/update/{payment_id}")
-async def update_payment(payment_id: int, payment: Payment):
+@router.put("/api/payment/update/{payment_id}")
+def update_payment(payment_id: int, payment: Payment):
     query = """
         UPDATE Payment 
         SET ApplicationID = %s, Amount = %s, PaymentDate = %s
@@ -511,12 +977,21 @@ async def update_payment(payment_id: int, payment: Payment):
     try:
         connection = database.get_connection()
         cursor = connection.cursor()
+        old_payment = fetch_payment_revenue(cursor, payment_id)
         cursor.execute(query, (payment.ApplicationID, payment.Amount, payment.PaymentDate, payment_id))
-        connection.commit()
-
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail=f"Payment with ID {payment_id} not found")
 
+        deltas = []
+        if old_payment:
+            old_date, old_unit_id, old_amount = old_payment
+            deltas.append(revenue_delta(old_date, old_unit_id, -to_amount(old_amount), -1))
+        deltas.append(revenue_delta(payment.PaymentDate, fetch_unit_id(cursor, payment.ApplicationID),
+                                    payment.Amount))
+        change = stage_change(cursor, "Payment", "update", payment_id, payment, deltas)
+        connection.commit()
+
+        publish_change(change)
         return {"message": f"Payment with ID {payment_id} updated successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -528,18 +1003,25 @@ async def update_payment(payment_id: int, payment: Payment):
 
 
 
-@app.delete("/api/payment/delete/{payment_id}")
-async def delete_payment(payment_id: int):
+@router.delete("/api/payment/delete/{payment_id}")
+def delete_payment(payment_id: int):
     query = "DELETE FROM Payment WHERE PaymentID = %s"
     try:
         connection = database.get_connection()
         cursor = connection.cursor()
+        old_payment = fetch_payment_revenue(cursor, payment_id)
         cursor.execute(query, (payment_id,))
-        connection.commit()
-
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail=f"Payment with ID {payment_id} not found")
 
+        deltas = []
+        if old_payment:
+            old_date, old_unit_id, old_amount = old_payment
+            deltas.append(revenue_delta(old_date, old_unit_id, -to_amount(old_amount), -1))
+        change = stage_change(cursor, "Payment", "delete", payment_id, deltas=deltas)
+        connection.commit()
+
+        publish_change(change)
         return {"message": f"Payment with ID {payment_id} deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -550,6 +1032,97 @@ async def delete_payment(payment_id: int):
             connection.close()
 
 
+def lookup_unit_id(application_id):
+    connection = database.get_connection()
+    cursor = connection.cursor()
+    try:
+        return fetch_unit_id(cursor, application_id)
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def fetch_unit_id(cursor, application_id):
+    cursor.execute("SELECT UnitID FROM Application WHERE ApplicationID = %s", (application_id,))
+    rows = cursor.fetchall()
+    return rows[0][0] if rows else None
+
+
+def fetch_payment_revenue(cursor, payment_id):
+    cursor.execute("""
+        SELECT p.PaymentDate, a.UnitID, p.Amount
+        FROM Payment p LEFT JOIN Application a ON p.ApplicationID = a.ApplicationID
+        WHERE p.PaymentID = %s
+        FOR UPDATE
+    """, (payment_id,))
+    rows = cursor.fetchall()
+    return rows[0] if rows else None
+
+
+def fetch_application_state(cursor, application_id):
+    cursor.execute("SELECT UnitID, StatusID FROM Application WHERE ApplicationID = %s FOR UPDATE",
+                   (application_id,))
+    rows = cursor.fetchall()
+    unit_id, status_id = rows[0] if rows else (None, None)
+    cursor.execute("SELECT COALESCE(SUM(Amount), 0), COUNT(*) FROM Payment WHERE ApplicationID = %s",
+                   (application_id,))
+    paid_total, paid_count = cursor.fetchall()[0]
+    return unit_id, status_id, to_amount(paid_total), paid_count
+
+
+@router.get("/api/payment/summary/daily")
+async def get_daily_revenue(start: str = None, end: str = None):
+    return {"daily": revenue.summary("day", start, end)}
+
+
+@router.get("/api/payment/summary/monthly")
+async def get_monthly_revenue(start: str = None, end: str = None):
+    return {"monthly": revenue.summary("month", start, end)}
+
+
+@router.get("/api/payment/summary/unit")
+async def get_unit_revenue():
+    return {"units": revenue.summary("unit")}
+
+
+@router.post("/api/payment/summary/rebuild")
+def rebuild_revenue_summary():
+    connection = None
+    try:
+        connection = database.get_connection()
+        revenue.rebuild(connection)
+        return {"message": "Revenue summary rebuilt successfully"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if connection:
+            connection.close()
+
+
+class ReconciliationRequest(BaseModel):
+    SampleLimit: int = payment_reconciliation.DEFAULT_SAMPLE_LIMIT
+
+
+#  Reconcile every Payment against its Application in the background (POST)
+@router.post("/api/payment/reconcile")
+async def start_payment_reconciliation(reconciliation_request: ReconciliationRequest):
+    if not 0 <= reconciliation_request.SampleLimit <= 100000:
+        raise HTTPException(status_code=400, detail="SampleLimit must be between 0 and 100000")
+    job = payment_reconciliation.new_job(reconciliation_request.SampleLimit)
+    task = asyncio.create_task(asyncio.to_thread(payment_reconciliation.run_job, job))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return {"message": "Payment reconciliation started", "JobID": job["JobID"]}
+
+
+@router.get("/api/payment/reconcile/{job_id}")
+async def get_payment_reconciliation(job_id: str):
+    job = payment_reconciliation.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Reconciliation job with ID {job_id} not found")
+    return job
+
+
 class Exam(BaseModel):
     ExamID: int
     UnitID: str
@@ -558,14 +1131,14 @@ class Exam(BaseModel):
 
 
 
-@app.get("/api/exam/all")
-async def get_all_exams():
+@router.get("/api/exam/all")
+async def get_all_exams(request: Request):
+    cached = reference_rows.rows("Exam")
+    if cached is not None:
+        return {"exams": cached}
     query = "SELECT * FROM Exam"
     try:
-        connection = database.get_connection()
-        cursor = connection.cursor()
-        cursor.execute(query)
-        exams = cursor.fetchall()
+        exams = await guarded_fetchall(request, query, route_class="read")
 
         result = [
             {
@@ -577,18 +1150,22 @@ async def get_all_exams():
             for exam in exams
         ]
         return {"exams": result}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
 
 
-@app.post("/api/exam/add")
-async def add_exam(exam: Exam):
+@router.get("/api/exam/get/{exam_id}")
+async def get_exam(exam_id: int):
+    rows = await load_or_404("Exam", exam_id)
+    return {"ExamID": rows[0][0], "UnitID": rows[0][1], "ExamName": rows[0][2], "MaxMarks": rows[0][3]}
+
+
+
+@router.post("/api/exam/add")
+def add_exam(exam: Exam):
     query = """
         INSERT INTO Exam (ExamID, UnitID, ExamName, MaxMarks)
         VALUES (%s, %s, %s, %s)
@@ -597,7 +1174,12 @@ async def add_exam(exam: Exam):
         connection = database.get_connection()
         cursor = connection.cursor()
         cursor.execute(query, (exam.ExamID, exam.UnitID, exam.ExamName, exam.MaxMarks))
+        change = stage_change(cursor, "Exam", "insert", exam.ExamID, exam)
         connection.commit()
+
+        reference_index.add("Exam", exam.ExamID)
+        reference_rows.load(connection, ["Exam"])
+        publish_change(change)
         return {"message": "Exam added successfully", "ExamID": exam.ExamID}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -609,8 +1191,8 @@ async def add_exam(exam: Exam):
 
 
 
-@app.put("/api/exam/update/{exam_id}")
-async def update_exam(exam_id: int, exam: Exam):
+@router.put("/api/exam/update/{exam_id}")
+def update_exam(exam_id: int, exam: Exam):
     query = """
         UPDATE Exam 
         SET UnitID = %s, ExamName = %s, MaxMarks = %s
@@ -620,11 +1202,14 @@ async def update_exam(exam_id: int, exam: Exam):
         connection = database.get_connection()
         cursor = connection.cursor()
         cursor.execute(query, (exam.UnitID, exam.ExamName, exam.MaxMarks, exam_id))
-        connection.commit()
-
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail=f"Exam with ID {exam_id} not found")
+        change = stage_change(cursor, "Exam", "update", exam_id, exam)
+        connection.commit()
 
+        admit_card_view.refresh_by(connection, "ExamID", exam_id)
+        reference_rows.load(connection, ["Exam"])
+        publish_change(change)
         return {"message": f"Exam with ID {exam_id} updated successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -636,18 +1221,22 @@ async def update_exam(exam_id: int, exam: Exam):
 
 
 
-@app.delete("/api/exam/delete/{exam_id}")
-async def delete_exam(exam_id: int):
+@router.delete("/api/exam/delete/{exam_id}")
+def delete_exam(exam_id: int):
     query = "DELETE FROM Exam WHERE ExamID = %s"
     try:
         connection = database.get_connection()
         cursor = connection.cursor()
         cursor.execute(query, (exam_id,))
-        connection.commit()
-
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail=f"Exam with ID {exam_id} not found")
+        change = stage_change(cursor, "Exam", "delete", exam_id)
+        connection.commit()
 
+        reference_index.remove("Exam", exam_id)
+        admit_card_view.refresh_by(connection, "ExamID", exam_id)
+        reference_rows.load(connection, ["Exam"])
+        publish_change(change)
         return {"message": f"Exam with ID {exam_id} deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -657,121 +1246,133 @@ async def delete_exam(exam_id: int):
         if connection:
             connection.close()
 
-            class ExamSchedule(BaseModel):
-                ExamScheduleID: int
-                ExamID: int
-                ExamDate: str
-                ExamTime: str
-                VenueID: int
-
-
-            @app.get("/api/exam_schedule/all")
-            async def get_all_exam_schedules():
-                query = "SELECT * FROM ExamSchedule"
-                try:
-                    connection = database.get_connection()
-                    cursor = connection.cursor()
-                    cursor.execute(query)
-                    exam_schedules = cursor.fetchall()
-
-                    result = [
-                        {
-                            "ExamScheduleID": exam[0],
-                            "ExamID": exam[1],
-                            "ExamDate": str(exam[2]),
-                            "ExamTime": str(exam[3]),
-                            "VenueID": exam[4]
-                        }
-                        for exam in exam_schedules
-                    ]
-                    return {"exam_schedules": result}
-                except Exception as e:
-                    raise HTTPException(status_code=500, detail=str(e))
-                finally:
-                    if cursor:
-                        cursor.close()
-                    if connection:
-                        connection.close()
-
-
-            @app.post("/api/exam_schedule/add")
-            async def add_exam_schedule(exam_schedule: ExamSchedule):
-                query = """
-                    INSERT INTO ExamSchedule (ExamScheduleID, ExamID, ExamDate, ExamTime, VenueID)
-                    VALUES (%s, %s, %s, %s, %s)
-                """
-                try:
-                    connection = database.get_connection()
-                    cursor = connection.cursor()
-                    cursor.execute(
-                        query,
-                        (exam_schedule.ExamScheduleID, exam_schedule.ExamID, exam_schedule.ExamDate,
-                         exam_schedule.ExamTime, exam_schedule.VenueID)
-                    )
-                    connection.commit()
-                    return {"message": "Exam Schedule added successfully",
-                            "ExamScheduleID": exam_schedule.ExamScheduleID}
-                except Exception as e:
-                    raise HTTPException(status_code=500, detail=str(e))
-                finally:
-                    if cursor:
-                        cursor.close()
-                    if connection:
-                        connection.close()
-
-
-            @app.put("/api/exam_schedule/update/{exam_schedule_id}")
-            async def update_exam_schedule(exam_schedule_id: int, exam_schedule: ExamSchedule):
-                query = """
-                    UPDATE ExamSchedule 
-                    SET ExamID = %s, ExamDate = %s, ExamTime = %s, VenueID = %s
-                    WHERE ExamScheduleID = %s
-                """
-                try:
-                    connection = database.get_connection()
-                    cursor = connection.cursor()
-                    cursor.execute(
-                        query,
-                        (exam_schedule.ExamID, exam_schedule.ExamDate, exam_schedule.ExamTime,
-                         exam_schedule.VenueID, exam_schedule_id)
-                    )
-                    connection.commit()
-
-                    if cursor.rowcount == 0:
-                        raise HTTPException(status_code=404,
-                                            detail=f"ExamSchedule with ID {exam_schedule_id} not found")
-
-                    return {"message": f"ExamSchedule with ID {exam_schedule_id} updated successfully"}
-                except Exception as e:
-                    raise HTTPException(status_code=500, detail=str(e))
-                finally:
-                    if cursor:
-                        cursor.close()
-                    if connection:
-                        connection.close()
-
-
-            @app.delete("/api/exam_schedule/delete/{exam_schedule_id}")
-            async def delete_exam_schedule(exam_schedule_id: int):
-                query = "DELETE FROM ExamSchedule WHERE ExamScheduleID = %s"
-                try:
-                    connection = database.get_connection()
-                    cursor = connection.cursor()
-                    cursor.execute(query, (exam_schedule_id,))
-                    connection.commit()
-
-                    if cursor.rowcount == 0:
-                        raise HTTPException(status_code=404,
-                                            detail=f"ExamSchedule with ID {exam_schedule_id} not found")
-
-                    return {"message": f"ExamSchedule with ID {exam_schedule_id} deleted successfully"}
-                except Exception as e:
-                    raise HTTPException(status_code=500, detail=str(e))
-                finally:
-                    if cursor:
-                        cursor.close()
-                    if connection:
-                        connection.close()
+
+
+class ExamSchedule(BaseModel):
+    ExamScheduleID: int
+    ExamID: int
+    ExamDate: str
+    ExamTime: str
+    VenueID: int
+
+
+@router.get("/api/exam_schedule/all")
+async def get_all_exam_schedules(request: Request):
+    query = "SELECT * FROM ExamSchedule"
+    try:
+        exam_schedules = await guarded_fetchall(request, query, route_class="read")
+
+        result = [
+            {
+                "ExamScheduleID": exam[0],
+                "ExamID": exam[1],
+                "ExamDate": str(exam[2]),
+                "ExamTime": str(exam[3]),
+                "VenueID": exam[4]
+            }
+            for exam in exam_schedules
+        ]
+        return {"exam_schedules": result}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/api/exam_schedule/get/{exam_schedule_id}")
+async def get_exam_schedule(exam_schedule_id: int):
+    rows = await load_or_404("ExamSchedule", exam_schedule_id)
+    return {"ExamScheduleID": rows[0][0], "ExamID": rows[0][1], "ExamDate": str(rows[0][2]),
+            "ExamTime": str(rows[0][3]), "VenueID": rows[0][4]}
+
+
+@router.post("/api/exam_schedule/add")
+def add_exam_schedule(exam_schedule: ExamSchedule):
+    query = """
+        INSERT INTO ExamSchedule (ExamScheduleID, ExamID, ExamDate, ExamTime, VenueID)
+        VALUES (%s, %s, %s, %s, %s)
+    """
+    try:
+        connection = database.get_connection()
+        cursor = connection.cursor()
+        cursor.execute(
+            query,
+            (exam_schedule.ExamScheduleID, exam_schedule.ExamID, exam_schedule.ExamDate,
+             exam_schedule.ExamTime, exam_schedule.VenueID)
+        )
+        change = stage_change(cursor, "ExamSchedule", "insert", exam_schedule.ExamScheduleID, exam_schedule)
+        connection.commit()
+
+        reference_index.add("ExamSchedule", exam_schedule.ExamScheduleID)
+        publish_change(change)
+        return {"message": "Exam Schedule added successfully",
+                "ExamScheduleID": exam_schedule.ExamScheduleID}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+
+@router.put("/api/exam_schedule/update/{exam_schedule_id}")
+def update_exam_schedule(exam_schedule_id: int, exam_schedule: ExamSchedule):
+    query = """
+        UPDATE ExamSchedule 
+        SET ExamID = %s, ExamDate = %s, ExamTime = %s, VenueID = %s
+        WHERE ExamScheduleID = %s
+    """
+    try:
+        connection = database.get_connection()
+        cursor = connection.cursor()
+        cursor.execute(
+            query,
+            (exam_schedule.ExamID, exam_schedule.ExamDate, exam_schedule.ExamTime,
+             exam_schedule.VenueID, exam_schedule_id)
+        )
+        if cursor.rowcount == 0:
+            raise HTTPException(status_code=404,
+                                detail=f"ExamSchedule with ID {exam_schedule_id} not found")
+        change = stage_change(cursor, "ExamSchedule", "update", exam_schedule_id, exam_schedule)
+        connection.commit()
+
+        admit_card_view.refresh_schedule(connection, exam_schedule_id)
+        publish_change(change)
+        return {"message": f"ExamSchedule with ID {exam_schedule_id} updated successfully"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+
+@router.delete("/api/exam_schedule/delete/{exam_schedule_id}")
+def delete_exam_schedule(exam_schedule_id: int):
+    query = "DELETE FROM ExamSchedule WHERE ExamScheduleID = %s"
+    try:
+        connection = database.get_connection()
+        cursor = connection.cursor()
+        cursor.execute(query, (exam_schedule_id,))
+        if cursor.rowcount == 0:
+            raise HTTPException(status_code=404,
+                                detail=f"ExamSchedule with ID {exam_schedule_id} not found")
+        change = stage_change(cursor, "ExamSchedule", "delete", exam_schedule_id)
+        connection.commit()
+
+        admit_card_view.refresh_schedule(connection, exam_schedule_id)
+        reference_index.remove("ExamSchedule", exam_schedule_id)
+        publish_change(change)
+        return {"message": f"ExamSchedule with ID {exam_schedule_id} deleted successfully"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
 
 
 class AdmitCard(BaseModel):
@@ -782,14 +1383,11 @@ class AdmitCard(BaseModel):
 
 
 
-@app.get("/api/admit_card/all")
-async def get_all_admit_cards():
+@router.get("/api/admit_card/all")
+async def get_all_admit_cards(request: Request):
     query = "SELECT * FROM AdmitCard"
     try:
-        connection = database.get_connection()
-        cursor = connection.cursor()
-        cursor.execute(query)
-        admit_cards = cursor.fetchall()
+        admit_cards = await guarded_fetchall(request, query, route_class="report")
 
         result = [
             {
@@ -801,18 +1399,38 @@ async def get_all_admit_cards():
             for admit in admit_cards
         ]
         return {"admit_cards": result}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
 
 
-@app.post("/api/admit_card/add")
-async def add_admit_card(admit_card: AdmitCard):
+#  Admit Cards of a Student from the precomputed view (GET)
+@router.get("/api/admit_card/by_student/{student_id}")
+async def get_admit_cards_by_student(student_id: int):
+    cards = admit_card_view.lookup(student_id)
+    if not cards:
+        raise HTTPException(status_code=404, detail=f"No admit cards found for Student with ID {student_id}")
+    return {"StudentID": student_id,
+            "admit_cards": [{**card, "CheckinToken": checkin.issue_for_card(card)} for card in cards]}
+
+
+#  Rebuild Admit Card View in bulk, e.g. the night before an exam (POST)
+@router.post("/api/admit_card/view/rebuild")
+async def rebuild_admit_card_view():
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, refresh_admit_cards)
+        return {"message": "Admit card view rebuilt successfully", "AdmitCards": len(admit_card_view)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/api/admit_card/add")
+def add_admit_card(admit_card: AdmitCard):
+    check_not_archived("AdmitCard", admit_card.AdmitCardID)
+    check_references(("Application", admit_card.ApplicationID),
+                     ("ExamSchedule", admit_card.ExamScheduleID))
     query = """
         INSERT INTO AdmitCard (AdmitCardID, ApplicationID, ExamScheduleID, AdmitDate)
         VALUES (%s, %s, %s, %s)
@@ -824,8 +1442,13 @@ async def add_admit_card(admit_card: AdmitCard):
             query,
             (admit_card.AdmitCardID, admit_card.ApplicationID, admit_card.ExamScheduleID, admit_card.AdmitDate)
         )
+        change = stage_change(cursor, "AdmitCard", "insert", admit_card.AdmitCardID, admit_card)
         connection.commit()
-        return {"message": "Admit Card added successfully", "AdmitCardID": admit_card.AdmitCardID}
+
+        admit_card_view.refresh_card(connection, admit_card.AdmitCardID)
+        publish_change(change)
+        return {"message": "Admit Card added successfully", "AdmitCardID": admit_card.AdmitCardID,
+                "CheckinToken": checkin.issue_for_card(admit_card_view.card(admit_card.AdmitCardID))}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
@@ -836,8 +1459,8 @@ async def add_admit_card(admit_card: AdmitCard):
 
 
 
-@app.put("/api/admit_card/update/{admit_card_id}")
-async def update_admit_card(admit_card_id: int, admit_card: AdmitCard):
+@router.put("/api/admit_card/update/{admit_card_id}")
+def update_admit_card(admit_card_id: int, admit_card: AdmitCard):
     query = """
         UPDATE AdmitCard 
         SET ApplicationID = %s, ExamScheduleID = %s, AdmitDate = %s
@@ -850,11 +1473,13 @@ async def update_admit_card(admit_card_id: int, admit_card: AdmitCard):
             query,
             (admit_card.ApplicationID, admit_card.ExamScheduleID, admit_card.AdmitDate, admit_card_id)
         )
-        connection.commit()
-
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail=f"AdmitCard with ID {admit_card_id} not found")
+        change = stage_change(cursor, "AdmitCard", "update", admit_card_id, admit_card)
+        connection.commit()
 
+        admit_card_view.refresh_card(connection, admit_card_id)
+        publish_change(change)
         return {"message": f"AdmitCard with ID {admit_card_id} updated successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -866,18 +1491,20 @@ async def update_admit_card(admit_card_id: int, admit_card: AdmitCard):
 
 
 
-@app.delete("/api/admit_card/delete/{admit_card_id}")
-async def delete_admit_card(admit_card_id: int):
+@router.delete("/api/admit_card/delete/{admit_card_id}")
+def delete_admit_card(admit_card_id: int):
     query = "DELETE FROM AdmitCard WHERE AdmitCardID = %s"
     try:
         connection = database.get_connection()
         cursor = connection.cursor()
         cursor.execute(query, (admit_card_id,))
-        connection.commit()
-
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail=f"AdmitCard with ID {admit_card_id} not found")
+        change = stage_change(cursor, "AdmitCard", "delete", admit_card_id)
+        connection.commit()
 
+        admit_card_view.remove_card(admit_card_id)
+        publish_change(change)
         return {"message": f"AdmitCard with ID {admit_card_id} deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -895,10 +1522,17 @@ class Result(BaseModel):
 
 
 
-@app.post("/api/result/add")
-async def add_result(result: Result):
-    # Check if Student has given Exam
-    check_query = "SELECT * FROM Exam WHERE ExamID = %s"
+@router.get("/api/result/get/{result_id}")
+async def get_result(result_id: int):
+    rows = await load_or_404("Result", result_id)
+    return {"ResultID": rows[0][0], "StudentID": rows[0][1], "ExamID": rows[0][2], "Marks": rows[0][3]}
+
+
+
+@router.post("/api/result/add")
+def add_result(result: Result):
+    check_not_archived("Result", result.ResultID)
+    check_references(("Student", result.StudentID), ("Exam", result.ExamID))
     insert_query = """
         INSERT INTO Result (ResultID, StudentID, ExamID, Marks)
         VALUES (%s, %s, %s, %s)
@@ -906,18 +1540,14 @@ async def add_result(result: Result):
     try:
         connection = database.get_connection()
         cursor = connection.cursor()
-
-        cursor.execute(check_query, (result.ExamID,))
-        exam_exists = cursor.fetchone()
-
-        if not exam_exists:
-            raise HTTPException(status_code=400, detail="Student has not given this Exam")
-
         cursor.execute(
             insert_query,
             (result.ResultID, result.StudentID, result.ExamID, result.Marks)
         )
+        change = stage_change(cursor, "Result", "insert", result.ResultID, result)
         connection.commit()
+
+        publish_change(change)
         return {"message": "Result added successfully", "ResultID": result.ResultID}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -929,8 +1559,8 @@ async def add_result(result: Result):
 
 
 
-@app.put("/api/result/update/{result_id}")
-async def update_result(result_id: int, result: Result):
+@router.put("/api/result/update/{result_id}")
+def update_result(result_id: int, result: Result):
     query = """
         UPDATE Result
         SET StudentID = %s, ExamID = %s, Marks = %s
@@ -940,11 +1570,12 @@ async def update_result(result_id: int, result: Result):
         connection = database.get_connection()
         cursor = connection.cursor()
         cursor.execute(query, (result.StudentID, result.ExamID, result.Marks, result_id))
-        connection.commit()
-
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail=f"Result with ID {result_id} not found")
+        change = stage_change(cursor, "Result", "update", result_id, result)
+        connection.commit()
 
+        publish_change(change)
         return {"message": f"Result with ID {result_id} updated successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -956,18 +1587,19 @@ async def update_result(result_id: int, result: Result):
 
 
 
-@app.delete("/api/result/delete/{result_id}")
-async def delete_result(result_id: int):
+@router.delete("/api/result/delete/{result_id}")
+def delete_result(result_id: int):
     query = "DELETE FROM Result WHERE ResultID = %s"
     try:
         connection = database.get_connection()
         cursor = connection.cursor()
         cursor.execute(query, (result_id,))
-        connection.commit()
-
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail=f"Result with ID {result_id} not found")
+        change = stage_change(cursor, "Result", "delete", result_id)
+        connection.commit()
 
+        publish_change(change)
         return {"message": f"Result with ID {result_id} deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -979,8 +1611,44 @@ async def delete_result(result_id: int):
 
 
 
-@app.get("/api/result/highest_mark")
-async def get_highest_mark_student():
+#  Streaming CSV Import of Results (POST), reports progress as NDJSON
+@router.post("/api/result/import")
+async def import_result_csv(file: UploadFile = File(...)):
+    loop = asyncio.get_running_loop()
+    # Copy the upload to our own temp file so it outlives the request's form cleanup
+    upload = tempfile.TemporaryFile()
+    await loop.run_in_executor(None, shutil.copyfileobj, file.file, upload)
+    upload.seek(0)
+
+    def chunk_committed(imported):
+        # Runs in the import thread after each commit, so a disconnect or a later error
+        # cannot leave committed rows behind stale caches
+        record_change("Result", "import", None, {"imported": imported})
+
+    async def progress():
+        connection = None
+        try:
+            connection = await loop.run_in_executor(None, database.get_connection)
+            events = import_results(upload, connection, chunk_committed)
+            while True:
+                event = await loop.run_in_executor(None, next, events, None)
+                if event is None:
+                    break
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            yield json.dumps({"event": "error", "line": None, "error": str(e)}) + "\n"
+        finally:
+            upload.close()
+            if connection:
+                connection.close()
+
+    return StreamingResponse(progress(), media_type="application/x-ndjson")
+
+
+REPORT_CACHE_TABLES = ("Result", "Student")
+
+
+def query_highest_mark():
     query = """
         SELECT s.Name, r.Marks 
         FROM Result r
@@ -988,28 +1656,16 @@ async def get_highest_mark_student():
         ORDER BY r.Marks DESC
         LIMIT 1
     """
-    try:
-        connection = database.get_connection()
-        cursor = connection.cursor()
-        cursor.execute(query)
-        highest = cursor.fetchone()
+    rows = fetchall_with_deadline(query, route_class="report")
+    if not rows:
+        return {"message": "No results found"}
 
-        if not highest:
-            return {"message": "No results found"}
-
-        return {"Highest_Mark_Student": highest[0], "Marks": highest[1]}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
+    highest = rows[0]
 
+    return {"Highest_Mark_Student": highest[0], "Marks": highest[1]}
 
 
-@app.get("/api/result/lowest_mark")
-async def get_lowest_mark_student():
+def query_lowest_mark():
     query = """
         SELECT s.Name, r.Marks 
         FROM Result r
@@ -1017,50 +1673,58 @@ async def get_lowest_mark_student():
         ORDER BY r.Marks ASC
         LIMIT 1
     """
-    try:
-        connection = database.get_connection()
-        cursor = connection.cursor()
-        cursor.execute(query)
-        lowest = cursor.fetchone()
+    rows = fetchall_with_deadline(query, route_class="report")
+    if not rows:
+        return {"message": "No results found"}
 
-        if not lowest:
-            return {"message": "No results found"}
+    lowest = rows[0]
 
-        return {"Lowest_Mark_Student": lowest[0], "Marks": lowest[1]}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
+    return {"Lowest_Mark_Student": lowest[0], "Marks": lowest[1]}
 
 
-
-@app.get("/api/result/ordered_by_marks")
-async def get_students_ordered_by_marks():
+def query_students_ordered_by_marks():
     query = """
         SELECT s.Name, r.Marks 
         FROM Result r
         JOIN Student s ON r.StudentID = s.StudentID
         ORDER BY r.Marks DESC
     """
+    students = fetchall_with_deadline(query, route_class="report")
+    result = [{"Name": student[0], "Marks": student[1]} for student in students]
+
+    return {"Ordered_Students": result}
+
+
+@router.get("/api/result/highest_mark")
+async def get_highest_mark_student():
     try:
-        connection = database.get_connection()
-        cursor = connection.cursor()
-        cursor.execute(query)
-        students = cursor.fetchall()
+        return await report_cache.get("result:highest_mark", query_highest_mark, REPORT_CACHE_TABLES)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        result = [{"Name": student[0], "Marks": student[1]} for student in students]
 
-        return {"Ordered_Students": result}
+
+@router.get("/api/result/lowest_mark")
+async def get_lowest_mark_student():
+    try:
+        return await report_cache.get("result:lowest_mark", query_lowest_mark, REPORT_CACHE_TABLES)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
+
+
+
+@router.get("/api/result/ordered_by_marks")
+async def get_students_ordered_by_marks():
+    try:
+        return await report_cache.get("result:ordered_by_marks", query_students_ordered_by_marks,
+                                      REPORT_CACHE_TABLES)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/api/result/cache_stats")
+async def get_report_cache_stats():
+    return report_cache.stats()
 
 class Unit(BaseModel):
     UnitID: str
@@ -1069,8 +1733,15 @@ class Unit(BaseModel):
 
 
 
-@app.post("/api/unit/add")
-async def add_unit(unit: Unit):
+@router.get("/api/unit/get/{unit_id}")
+async def get_unit(unit_id: str):
+    rows = await load_or_404("Unit", unit_id)
+    return {"UnitID": rows[0][0], "UnitName": rows[0][1], "MaxCapacity": rows[0][2]}
+
+
+
+@router.post("/api/unit/add")
+def add_unit(unit: Unit):
     query = """
         INSERT INTO Unit (UnitID, UnitName, MaxCapacity)
         VALUES (%s, %s, %s)
@@ -1079,7 +1750,13 @@ async def add_unit(unit: Unit):
         connection = database.get_connection()
         cursor = connection.cursor()
         cursor.execute(query, (unit.UnitID, unit.UnitName, unit.MaxCapacity))
+        change = stage_change(cursor, "Unit", "insert", unit.UnitID, unit,
+                              [["capacity", unit.UnitID, unit.MaxCapacity]])
         connection.commit()
+
+        reference_index.add("Unit", unit.UnitID)
+        reference_rows.load(connection, ["Unit"])
+        publish_change(change)
         return {"message": "Unit added successfully", "UnitID": unit.UnitID}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1091,8 +1768,8 @@ async def add_unit(unit: Unit):
 
 
 
-@app.put("/api/unit/update/{unit_id}")
-async def update_unit(unit_id: str, unit: Unit):
+@router.put("/api/unit/update/{unit_id}")
+def update_unit(unit_id: str, unit: Unit):
     query = """
         UPDATE Unit
         SET UnitName = %s, MaxCapacity = %s
@@ -1102,11 +1779,14 @@ async def update_unit(unit_id: str, unit: Unit):
         connection = database.get_connection()
         cursor = connection.cursor()
         cursor.execute(query, (unit.UnitName, unit.MaxCapacity, unit_id))
-        connection.commit()
-
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail=f"Unit with ID {unit_id} not found")
+        change = stage_change(cursor, "Unit", "update", unit_id, unit,
+                              [["capacity", unit_id, unit.MaxCapacity]])
+        connection.commit()
 
+        reference_rows.load(connection, ["Unit"])
+        publish_change(change)
         return {"message": f"Unit with ID {unit_id} updated successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1117,18 +1797,21 @@ async def update_unit(unit_id: str, unit: Unit):
             connection.close()
 
 
-@app.delete("/api/unit/delete/{unit_id}")
-async def delete_unit(unit_id: str):
+@router.delete("/api/unit/delete/{unit_id}")
+def delete_unit(unit_id: str):
     query = "DELETE FROM Unit WHERE UnitID = %s"
     try:
         connection = database.get_connection()
         cursor = connection.cursor()
         cursor.execute(query, (unit_id,))
-        connection.commit()
-
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail=f"Unit with ID {unit_id} not found")
+        change = stage_change(cursor, "Unit", "delete", unit_id, deltas=[["remove_unit", unit_id]])
+        connection.commit()
 
+        reference_index.remove("Unit", unit_id)
+        reference_rows.load(connection, ["Unit"])
+        publish_change(change)
         return {"message": f"Unit with ID {unit_id} deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1139,26 +1822,185 @@ async def delete_unit(unit_id: str):
             connection.close()
 
 
-@app.get("/api/unit/show_all")
-async def show_all_units():
+#  Cutoff Marks per Unit (GET)
+@router.get("/api/unit/cutoffs")
+async def get_unit_cutoffs():
+    try:
+        rankings = await ranking_cache.get()
+        return {"cutoffs": rankings.cutoffs()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+#  Rank List of a Unit, paginated (GET)
+@router.get("/api/unit/rank_list/{unit_id}")
+async def get_unit_rank_list(unit_id: str, offset: conint(ge=0) = 0, limit: conint(ge=1, le=1000) = 100):
+    try:
+        rankings = await ranking_cache.get()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    rank_list = rankings.rank_list(unit_id, offset, limit)
+    if rank_list is None:
+        raise HTTPException(status_code=404, detail=f"No ranked candidates for Unit with ID {unit_id}")
+    return rank_list
+
+
+@router.get("/api/unit/show_all")
+async def show_all_units(request: Request):
+    cached = reference_rows.rows("Unit")
+    if cached is not None:
+        return {"units": cached}
     query = "SELECT * FROM Unit"
     try:
-        connection = database.get_connection()
-        cursor = connection.cursor()
-        cursor.execute(query)
-        units = cursor.fetchall()
+        units = await guarded_fetchall(request, query, route_class="read")
 
         result = [
             {"UnitID": unit[0], "UnitName": unit[1], "MaxCapacity": unit[2]}
             for unit in units
         ]
         return {"units": result}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
 
+class ArchiveRequest(BaseModel):
+    ClosedBefore: date
+    ChunkSize: conint(ge=1, le=5000) = archive.DEFAULT_CHUNK_SIZE
+
+
+async def run_archive_job(job, chunk_size):
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, archive.run_job, job, chunk_size)
+    if not any(job["Moved"].values()):
+        return
+    # Hot-table caches now describe the current cycle only
+    await loop.run_in_executor(None, refresh_revenue)
+    await loop.run_in_executor(None, reconcile)
+    await loop.run_in_executor(None, refresh_admit_cards)
+    await loop.run_in_executor(None, refresh_references,
+                               ["Application", *(f"{table}Archive" for table in archive.ARCHIVE_TABLES)])
+    for table, moved in job["Moved"].items():
+        if moved:
+            await asyncio.to_thread(record_change, table, "archive", None,
+                                    {"Moved": moved, "ClosedBefore": job["ClosedBefore"]})
+
+
+#  Archive a closed admission cycle in the background (POST)
+@router.post("/api/archive/run")
+async def start_archive(archive_request: ArchiveRequest):
+    job = archive.new_job(archive_request.ClosedBefore)
+    task = asyncio.create_task(run_archive_job(job, archive_request.ChunkSize))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return {"message": "Archive job started", "JobID": job["JobID"]}
+
+
+@router.get("/api/archive/jobs/{job_id}")
+async def get_archive_job(job_id: str):
+    job = archive.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Archive job with ID {job_id} not found")
+    return job
+
+
+#  Historical reads from the archive tables (GET)
+@router.get("/api/archive/{table}")
+async def get_archived_rows(table: str, after: int = -1, limit: conint(ge=1, le=1000) = 100):
+    if table not in archive.ARCHIVE_TABLES:
+        raise HTTPException(status_code=404, detail=f"Table {table} is not archived")
+    try:
+        rows = await asyncio.to_thread(archive.fetch_archived, table, after, limit)
+        return {"table": table, "rows": rows, "next_after": rows[-1][archive.ARCHIVE_TABLES[table]]
+                if len(rows) == limit else None}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def current_snapshot():
+    current = snapshot.current()
+    if current is None:
+        raise HTTPException(status_code=503, detail="No analytics snapshot has been exported yet")
+    return current
+
+
+@router.get("/api/analytics/snapshot")
+async def get_analytics_snapshot():
+    return current_snapshot().info()
+
+
+@router.post("/api/analytics/snapshot/refresh")
+async def refresh_analytics_snapshot():
+    try:
+        manifest = await asyncio.to_thread(snapshot.export_snapshot, True)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if manifest is None:
+        raise HTTPException(status_code=409, detail="Another worker is already exporting a snapshot")
+    return {"message": "Analytics snapshot exported successfully", "Version": manifest["Version"]}
+
+
+#  Marks distribution as a percentage of MaxMarks (GET)
+@router.get("/api/analytics/marks_distribution")
+async def get_marks_distribution(exam_id: int = None, bins: conint(ge=1, le=100) = 10):
+    current = current_snapshot()
+    return {"SnapshotVersion": current.version,
+            **await asyncio.to_thread(snapshot.marks_distribution, current, exam_id, bins)}
+
+
+#  Revenue by day, month or year (GET)
+@router.get("/api/analytics/revenue")
+async def get_revenue_by_period(period: str = "month", start: str = None, end: str = None):
+    if period not in snapshot.PERIOD_UNITS:
+        raise HTTPException(status_code=400, detail="period must be one of day, month, year")
+    current = current_snapshot()
+    try:
+        periods = await asyncio.to_thread(snapshot.revenue_by_period, current, period, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"SnapshotVersion": current.version, "periods": periods}
+
+
+#  Applications per Unit with a status breakdown (GET)
+@router.get("/api/analytics/applications_per_unit")
+async def get_applications_per_unit():
+    current = current_snapshot()
+    return {"SnapshotVersion": current.version,
+            "units": await asyncio.to_thread(snapshot.applications_per_unit, current)}
+
+
+class CheckinRequest(BaseModel):
+    Tokens: List[str]
+    ExamScheduleID: Optional[int] = None
+    VenueID: Optional[int] = None
+
+
+#  Verify admit-card tokens at the exam hall without touching the database (POST)
+@router.post("/api/checkin/verify")
+async def verify_checkin(checkin_request: CheckinRequest):
+    if not checkin.enabled():
+        raise HTTPException(status_code=503, detail="Check-in is disabled: CHECKIN_SECRET is not set")
+    if len(checkin_request.Tokens) > 1000:
+        raise HTTPException(status_code=400, detail="At most 1000 tokens per request")
+    results = []
+    for token in checkin_request.Tokens:
+        try:
+            card = checkin.verify_token(token)
+        except ValueError as e:
+            results.append({"Token": token, "Valid": False, "Reason": str(e)})
+            continue
+        if checkin_request.ExamScheduleID is not None and card["ExamScheduleID"] != checkin_request.ExamScheduleID:
+            results.append({"Token": token, "Valid": False, "Reason": "Wrong exam", **card})
+            continue
+        if checkin_request.VenueID is not None and card["VenueID"] != checkin_request.VenueID:
+            results.append({"Token": token, "Valid": False, "Reason": "Wrong venue", **card})
+            continue
+        first_scan = checkin.attendance.record(card)
+        results.append({"Token": token, "Valid": True, "AlreadyCheckedIn": not first_scan, **card})
+    return {"results": results}
+
+
+@router.get("/api/checkin/stats")
+async def get_checkin_stats():
+    return checkin.attendance.stats()
@@ -0,0 +1,145 @@
+"""In-memory trigram index over Student.Name and Student.Address.
+
+Names and addresses are split into words, each word padded like pg_trgm
+("  word ") and cut into trigrams.  Every trigram keeps the set of
+StudentIDs containing it, so a query only touches the posting lists of
+its own trigrams instead of scanning every student.  Candidate
+generation walks at most MAX_CANDIDATES posting entries, so a query made
+of very common trigrams (a city name, say) costs the same bounded work
+as a rare one; past that bound the ranking covers a sample of matches.
+"""
+import itertools
+import math
+import re
+import threading
+from collections import defaultdict
+
+_WORD_RE = re.compile(r"\w+")
+
+# Upper bound on posting entries walked (and candidates scored) per query
+MAX_CANDIDATES = 5000
+
+
+def trigrams(text):
+    grams = set()
+    for word in _WORD_RE.findall(text.lower()):
+        padded = "  " + word + " "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+class TrigramIndex:
+    def __init__(self):
+        self._postings = defaultdict(set)
+        self._docs = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def build(self, rows):
+        with self._lock:
+            self._postings.clear()
+            self._docs.clear()
+            for student_id, name, address in rows:
+                self._add(student_id, name, address)
+
+    def add(self, student_id, name, address):
+        with self._lock:
+            self._remove(student_id)
+            self._add(student_id, name, address)
+
+    def remove(self, student_id):
+        with self._lock:
+            self._remove(student_id)
+
+    def search(self, query, limit=20, threshold=0.3):
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+
+        with self._lock:
+            # Rarest trigrams first: only the first (n - need + 1) of them can
+            # introduce a candidate, since any document sharing fewer than
+            # `need` trigrams is discarded anyway.
+            postings = sorted((self._postings.get(g, ()) for g in query_grams), key=len)
+            need = max(1, math.ceil(len(query_grams) * threshold))
+            seeds = len(postings) - need + 1
+
+            candidates = set()
+            budget = MAX_CANDIDATES
+            for ids in postings[:seeds]:
+                if len(ids) <= budget:
+                    candidates.update(ids)
+                    budget -= len(ids)
+                else:
+                    candidates.update(itertools.islice(ids, budget))
+                    budget = 0
+                if budget == 0:
+                    break
+
+            ranked = []
+            for student_id in candidates:
+                shared = sum(1 for ids in postings if student_id in ids)
+                if shared < need:
+                    continue
+                name, address, doc_grams = self._docs[student_id]
+                similarity = shared / (len(query_grams) + len(doc_grams) - shared)
+                ranked.append((shared / len(query_grams), similarity, student_id, name, address))
+
+        ranked.sort(key=lambda item: (-item[0], -item[1], item[2]))
+        return [
+            {"StudentID": student_id, "Name": name, "Address": address, "Score": round(score, 3)}
+            for score, _, student_id, name, address in ranked[:limit]
+        ]
+
+    def _add(self, student_id, name, address):
+        doc_grams = trigrams(name or "") | trigrams(address or "")
+        self._docs[student_id] = (name, address, doc_grams)
+        for gram in doc_grams:
+            self._postings[gram].add(student_id)
+
+    def _remove(self, student_id):
+        doc = self._docs.pop(student_id, None)
+        if doc is None:
+            return
+        for gram in doc[2]:
+            ids = self._postings.get(gram)
+            if ids is not None:
+                ids.discard(student_id)
+                if not ids:
+                    del self._postings[gram]
+
+
+student_index = TrigramIndex()
+
+
+def _iter_rows(cursor, batch_size):
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            return
+        yield from batch
+
+
+def load_students(connection, batch_size=10000):
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT StudentID, Name, Address FROM Student")
+        student_index.build(_iter_rows(cursor, batch_size))
+    finally:
+        cursor.close()
+
+
+def reload_student(connection, student_id):
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT StudentID, Name, Address FROM Student WHERE StudentID = %s", (student_id,))
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    if rows:
+        student_index.add(*rows[0])
+    else:
+        student_index.remove(student_id)
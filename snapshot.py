@@ -0,0 +1,286 @@
+"""Periodic columnar snapshots for the analytics endpoints.
+
+An export streams Student, Application, Payment, Result and Exam from a
+read connection (one consistent-snapshot transaction) and writes every
+column as its own `.npy` file under `<SNAPSHOT_DIR>/<version>/`.  String
+columns are dictionary-encoded to int32 codes, dates are datetime64[D],
+and NULLs become -1 codes, NaN or NaT, so every file is fixed-width and
+can be opened with `mmap_mode="r"`.  The `CURRENT` file is swapped
+atomically once a version is complete; readers memory-map the columns
+they need and answer with vectorized scans, never touching MySQL.  Only
+one worker exports at a time (a `flock` on `export.lock`); the others
+pick up the new version on their next read.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+import database
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR",
+                              os.path.join(tempfile.gettempdir(), "university-admission-snapshot"))
+SNAPSHOT_INTERVAL_SECONDS = 900
+KEEP_SNAPSHOTS = 2
+FETCH_BATCH_SIZE = 50000
+
+# Column kinds: "id" int64 (NULL -> -1), "int" int32 (NULL -> -1), "float" float64 (NULL -> NaN),
+# "date" datetime64[D] (NULL -> NaT), "dict" dictionary-encoded string (NULL -> -1)
+SNAPSHOT_TABLES = {
+    "Student": ("SELECT StudentID, Age FROM Student",
+                [("StudentID", "id"), ("Age", "int")]),
+    "Application": ("SELECT ApplicationID, StudentID, UnitID, StatusID FROM Application",
+                    [("ApplicationID", "id"), ("StudentID", "id"), ("UnitID", "dict"), ("StatusID", "int")]),
+    "Payment": ("SELECT PaymentID, ApplicationID, Amount, PaymentDate FROM Payment",
+                [("PaymentID", "id"), ("ApplicationID", "id"), ("Amount", "float"), ("PaymentDate", "date")]),
+    "Result": ("SELECT ResultID, StudentID, ExamID, Marks FROM Result",
+               [("ResultID", "id"), ("StudentID", "id"), ("ExamID", "id"), ("Marks", "float")]),
+    "Exam": ("SELECT ExamID, UnitID, MaxMarks FROM Exam",
+             [("ExamID", "id"), ("UnitID", "dict"), ("MaxMarks", "float")]),
+}
+PERIOD_UNITS = {"day": "D", "month": "M", "year": "Y"}
+
+
+def _encode(kind, values, dictionary):
+    if kind == "id":
+        return np.array([-1 if value is None else value for value in values], dtype=np.int64)
+    if kind == "int":
+        return np.array([-1 if value is None else value for value in values], dtype=np.int32)
+    if kind == "float":
+        return np.array([np.nan if value is None else float(value) for value in values], dtype=np.float64)
+    if kind == "date":
+        return np.array(["NaT" if value is None else str(value)[:10] for value in values], dtype="datetime64[D]")
+    return np.array([-1 if value is None else dictionary.setdefault(value, len(dictionary)) for value in values],
+                    dtype=np.int32)
+
+
+def _export_table(cursor, directory, table):
+    query, columns = SNAPSHOT_TABLES[table]
+    chunks = [[] for _ in columns]
+    dictionaries = {name: {} for name, kind in columns if kind == "dict"}
+    cursor.execute(query)
+    while True:
+        rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+        if not rows:
+            break
+        for index, (name, kind) in enumerate(columns):
+            chunks[index].append(_encode(kind, [row[index] for row in rows], dictionaries.get(name)))
+
+    row_count = 0
+    for (name, kind), parts in zip(columns, chunks):
+        empty = _encode(kind, [], {})
+        array = np.concatenate(parts) if parts else empty
+        np.save(os.path.join(directory, f"{table}.{name}.npy"), array)
+        row_count = len(array)
+    return {"Rows": row_count, "Dictionaries": {name: list(values) for name, values in dictionaries.items()}}
+
+
+def export_snapshot(force=False):
+    """Write a new snapshot version; return its manifest, or None if skipped."""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    with open(os.path.join(SNAPSHOT_DIR, "export.lock"), "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        current = _read_manifest(_current_version())
+        if not force and current and time.time() - current["CreatedAt"] < SNAPSHOT_INTERVAL_SECONDS:
+            return None
+
+        version = str(int(time.time() * 1000))
+        staging = tempfile.mkdtemp(prefix=".staging-", dir=SNAPSHOT_DIR)
+        try:
+            started = time.time()
+            connection = database.get_read_connection()
+            cursor = connection.cursor()
+            try:
+                connection.start_transaction(consistent_snapshot=True, readonly=True)
+                tables = {table: _export_table(cursor, staging, table) for table in SNAPSHOT_TABLES}
+                connection.commit()
+            finally:
+                cursor.close()
+                connection.close()
+            manifest = {"Version": version, "CreatedAt": started, "ExportSeconds": time.time() - started,
+                        "Tables": tables}
+            with open(os.path.join(staging, "manifest.json"), "w") as f:
+                json.dump(manifest, f)
+            os.rename(staging, os.path.join(SNAPSHOT_DIR, version))
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        pointer = os.path.join(SNAPSHOT_DIR, "CURRENT.tmp")
+        with open(pointer, "w") as f:
+            f.write(version)
+        os.replace(pointer, os.path.join(SNAPSHOT_DIR, "CURRENT"))
+        _prune(version)
+        return manifest
+
+
+def _prune(current):
+    versions = sorted(name for name in os.listdir(SNAPSHOT_DIR) if name.isdigit())
+    # Readers keep already-mapped columns of a deleted version until they switch
+    for name in versions[:-KEEP_SNAPSHOTS]:
+        if name != current:
+            shutil.rmtree(os.path.join(SNAPSHOT_DIR, name), ignore_errors=True)
+
+
+def _current_version():
+    try:
+        with open(os.path.join(SNAPSHOT_DIR, "CURRENT")) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _read_manifest(version):
+    if version is None:
+        return None
+    try:
+        with open(os.path.join(SNAPSHOT_DIR, version, "manifest.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class Snapshot:
+    def __init__(self, manifest):
+        self.manifest = manifest
+        self.version = manifest["Version"]
+        self._directory = os.path.join(SNAPSHOT_DIR, self.version)
+        self._columns = {}
+
+    def column(self, table, name):
+        key = (table, name)
+        array = self._columns.get(key)
+        if array is None:
+            array = self._columns[key] = np.load(os.path.join(self._directory, f"{table}.{name}.npy"),
+                                                 mmap_mode="r")
+        return array
+
+    def dictionary(self, table, name):
+        return self.manifest["Tables"][table]["Dictionaries"][name]
+
+    def info(self):
+        return {
+            "Version": self.version,
+            "CreatedAt": self.manifest["CreatedAt"],
+            "ExportSeconds": self.manifest["ExportSeconds"],
+            "Rows": {table: meta["Rows"] for table, meta in self.manifest["Tables"].items()},
+        }
+
+
+_lock = threading.Lock()
+_snapshot = None
+
+
+def current():
+    """Return the newest complete Snapshot, or None before the first export."""
+    global _snapshot
+    version = _current_version()
+    if version is None:
+        return None
+    with _lock:
+        if _snapshot is None or _snapshot.version != version:
+            manifest = _read_manifest(version)
+            if manifest is None:
+                return _snapshot
+            _snapshot = Snapshot(manifest)
+        return _snapshot
+
+
+async def snapshot_forever():
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            manifest = await loop.run_in_executor(None, export_snapshot)
+            if manifest:
+                logger.info("Exported analytics snapshot %s in %.1fs", manifest["Version"],
+                            manifest["ExportSeconds"])
+        except Exception:
+            logger.exception("Analytics snapshot export failed")
+        await asyncio.sleep(SNAPSHOT_INTERVAL_SECONDS)
+
+
+def marks_distribution(snapshot, exam_id=None, bins=10):
+    """Histogram of Result marks as a percentage of the exam's MaxMarks."""
+    exam_ids = snapshot.column("Exam", "ExamID")
+    max_marks = snapshot.column("Exam", "MaxMarks")
+    result_exams = snapshot.column("Result", "ExamID")
+    marks = snapshot.column("Result", "Marks")
+    if exam_id is not None:
+        selected = result_exams == exam_id
+        result_exams = result_exams[selected]
+        marks = marks[selected]
+
+    order = np.argsort(exam_ids)
+    sorted_exam_ids = exam_ids[order]
+    position = np.minimum(np.searchsorted(sorted_exam_ids, result_exams), max(len(order) - 1, 0))
+    if len(order):
+        found = sorted_exam_ids[position] == result_exams
+        out_of = np.asarray(max_marks)[order][position]
+    else:
+        found = np.zeros(len(result_exams), dtype=bool)
+        out_of = np.zeros(len(result_exams))
+    valid = found & (out_of > 0) & ~np.isnan(marks)
+    percentages = np.clip(marks[valid] / out_of[valid] * 100, 0, 100)
+
+    counts, edges = np.histogram(percentages, bins=bins, range=(0, 100))
+    has_rows = len(percentages) > 0
+    return {
+        "ExamID": exam_id,
+        "Results": int(len(percentages)),
+        "MeanPercent": float(percentages.mean()) if has_rows else None,
+        "MedianPercent": float(np.median(percentages)) if has_rows else None,
+        "StdDevPercent": float(percentages.std()) if has_rows else None,
+        "Bins": [
+            {"From": float(low), "To": float(high), "Count": int(count)}
+            for low, high, count in zip(edges[:-1], edges[1:], counts)
+        ],
+    }
+
+
+def revenue_by_period(snapshot, period="month", start=None, end=None):
+    dates = snapshot.column("Payment", "PaymentDate")
+    amounts = snapshot.column("Payment", "Amount")
+    selected = ~np.isnat(dates) & ~np.isnan(amounts)
+    if start is not None:
+        selected &= dates >= np.datetime64(start, "D")
+    if end is not None:
+        selected &= dates <= np.datetime64(end, "D")
+    keys = dates[selected].astype(f"datetime64[{PERIOD_UNITS[period]}]")
+    periods, index = np.unique(keys, return_inverse=True)
+    totals = np.bincount(index, weights=amounts[selected], minlength=len(periods))
+    counts = np.bincount(index, minlength=len(periods))
+    return [
+        {"Period": str(key), "Revenue": float(total), "Payments": int(count)}
+        for key, total, count in zip(periods, totals, counts)
+    ]
+
+
+def applications_per_unit(snapshot):
+    units = snapshot.dictionary("Application", "UnitID")
+    codes = snapshot.column("Application", "UnitID")
+    statuses = snapshot.column("Application", "StatusID")
+    known = codes >= 0
+    codes = codes[known]
+    status_ids, status_index = np.unique(statuses[known], return_inverse=True)
+    grid = np.bincount(codes.astype(np.int64) * len(status_ids) + status_index,
+                       minlength=len(units) * len(status_ids)).reshape(len(units), len(status_ids))
+    return [
+        {
+            "UnitID": unit_id,
+            "Applications": int(row.sum()),
+            "ByStatus": {str(status_id): int(count) for status_id, count in zip(status_ids, row) if count},
+        }
+        for unit_id, row in zip(units, grid)
+    ]
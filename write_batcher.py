@@ -0,0 +1,164 @@
+"""Group-commit coalescing for high-rate single-row inserts.
+
+When batching is enabled for a table, concurrent `insert` calls that
+arrive within `max_delay_ms` of each other are written with one
+multi-row INSERT and one commit.  If the combined statement fails (for
+example one duplicate key), the batch is replayed row by row inside the
+same transaction so every caller still gets its own outcome.  A deadlock
+or lock-wait timeout during the replay aborts the whole transaction, so
+the replay is restarted from the first row (and, after the last attempt,
+every row in the batch fails).  With
+batching disabled, `insert` is a plain single-row INSERT and commit.
+
+A caller may pass the change feed arguments for its row; the ChangeFeed
+row is then staged in the same transaction right after the data row, so
+a batch of N inserts still costs one commit, and `insert` returns the
+staged bus message.
+"""
+import asyncio
+
+import changes
+import database
+
+# Errors after which InnoDB may have rolled back the whole transaction
+# (ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT with innodb_rollback_on_timeout)
+TRANSACTION_ABORT_ERRNOS = {1213, 1205}
+REPLAY_ATTEMPTS = 3
+
+BATCH_CONFIG = {
+    "Application": {
+        "columns": ("ApplicationID", "StudentID", "UnitID", "StatusID"),
+        "enabled": False,
+        "max_delay_ms": 5,
+        "max_batch": 500,
+    },
+    "Payment": {
+        "columns": ("PaymentID", "ApplicationID", "Amount", "PaymentDate"),
+        "enabled": False,
+        "max_delay_ms": 5,
+        "max_batch": 500,
+    },
+}
+
+
+def configure(table, **settings):
+    BATCH_CONFIG[table].update(settings)
+
+
+def insert_query(table, columns, row_count=1):
+    row = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES " + ", ".join([row] * row_count)
+
+
+def write_rows(table, columns, rows, feed=None):
+    """Insert rows with one commit and return one (exception or None, bus message or None) per row.
+
+    feed, if given, holds one tuple of `changes.stage` arguments (or None) per row.
+    """
+    feed = feed or [None] * len(rows)
+    connection = database.get_connection()
+    cursor = connection.cursor()
+    try:
+        try:
+            cursor.execute(insert_query(table, columns, len(rows)), [value for row in rows for value in row])
+            messages = [changes.stage(cursor, *change) if change else None for change in feed]
+            connection.commit()
+            return [(None, message) for message in messages]
+        except database.Error:
+            connection.rollback()
+            if len(rows) == 1:
+                raise
+
+        for _ in range(REPLAY_ATTEMPTS):
+            try:
+                return replay_rows(connection, cursor, insert_query(table, columns), rows, feed)
+            except database.Error as err:
+                # Rows already replayed may be gone; start again from a clean transaction
+                connection.rollback()
+                if err.errno not in TRANSACTION_ABORT_ERRNOS:
+                    raise
+                aborted = err
+        return [(aborted, None)] * len(rows)
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def replay_rows(connection, cursor, query, rows, feed):
+    # A failed INSERT such as a duplicate key only rolls back its own
+    # statement in InnoDB, so the good rows can still share one commit.
+    # A failed feed row is not caught: its data row must not commit without it.
+    outcomes = []
+    for row, change in zip(rows, feed):
+        try:
+            cursor.execute(query, row)
+        except database.Error as err:
+            if err.errno in TRANSACTION_ABORT_ERRNOS:
+                raise
+            outcomes.append((err, None))
+            continue
+        outcomes.append((None, changes.stage(cursor, *change) if change else None))
+    connection.commit()
+    return outcomes
+
+
+class WriteBatcher:
+    def __init__(self, table):
+        self.table = table
+        self._pending = []
+        self._timer = None
+
+    @property
+    def config(self):
+        return BATCH_CONFIG[self.table]
+
+    async def insert(self, row, change=None):
+        config = self.config
+        loop = asyncio.get_running_loop()
+        if not config["enabled"]:
+            [(_, message)] = await loop.run_in_executor(None, write_rows, self.table, config["columns"], [row],
+                                                        [change])
+            return message
+
+        future = loop.create_future()
+        self._pending.append((row, change, future))
+        if len(self._pending) >= config["max_batch"]:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(config["max_delay_ms"] / 1000, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._write(batch))
+
+    async def _write(self, batch):
+        loop = asyncio.get_running_loop()
+        rows = [row for row, _, _ in batch]
+        feed = [change for _, change, _ in batch]
+        try:
+            outcomes = await loop.run_in_executor(None, write_rows, self.table, self.config["columns"], rows, feed)
+        except Exception as err:
+            outcomes = [(err, None)] * len(batch)
+        for (_, _, future), (error, message) in zip(batch, outcomes):
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(message)
+            else:
+                future.set_exception(error)
+
+
+_batchers = {}
+
+
+async def insert(table, row, change=None):
+    """Insert row; change is an optional tuple of `changes.stage` arguments committed with it."""
+    batcher = _batchers.get(table)
+    if batcher is None:
+        batcher = _batchers[table] = WriteBatcher(table)
+    return await batcher.insert(row, change)